@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import config
+import metrics
+
+# Annotation drawing shared by every output (annotated images, video frames,
+# evidence frames), plus the background writer for video evidence frames.
+
+VIOLATION_COLOR = (0, 0, 255)
+OBJECT_COLOR = (0, 255, 0)
+PLATE_COLOR = (255, 0, 0)
+VIOLATION_TYPES = ('littering', 'smoke')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def draw_detections(img, detections):
+    """
+    Draw detection boxes, labels and plate text onto img in place.
+    """
+    with metrics.stage("draw"):
+        _draw_detections(img, detections)
+    return img
+
+
+def annotate(img, detections):
+    """
+    Annotated copy of img; img itself is left clean.
+    """
+    return draw_detections(img.copy(), detections)
+
+
+def _draw_detections(img, detections):
+    for d in detections:
+        bbox = d['bbox']
+        label = d['violation_type']
+        conf = d['confidence']
+        color = VIOLATION_COLOR if label.lower() in VIOLATION_TYPES else OBJECT_COLOR
+        cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
+        cv2.putText(img, f"{label} {conf}", (bbox[0], bbox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        if d.get('license_plate') != "N/A":
+            cv2.putText(img, f"Plate: {d['license_plate']}", (bbox[0], bbox[3]+20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, PLATE_COLOR, 2)
+
+
+def write_jpeg(path, img, quality=None):
+    """
+    Encode img as JPEG at quality (default EVIDENCE_JPEG_QUALITY) and write it to path.
+    """
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality or config.EVIDENCE_JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"Could not encode {path}")
+    with open(path, 'wb') as f:
+        f.write(buf.tobytes())
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, config.EVIDENCE_WRITER_THREADS),
+                                       thread_name_prefix="evidence-writer")
+        return _pool
+
+
+class EvidenceWriter:
+    """
+    Writes one video's evidence frames on the shared writer threads, so JPEG
+    encoding and disk I/O stay off the pipeline's encoder thread.
+
+    Frames are handed over as they are, without a copy: the caller must not
+    modify a frame after submitting it. At most max_pending frames wait at
+    once; submit() blocks beyond that, which bounds the memory they hold.
+    """
+
+    def __init__(self, max_pending=None):
+        self._slots = threading.BoundedSemaphore(max(1, max_pending or config.EVIDENCE_MAX_PENDING))
+        self._futures = []
+        self._collector = metrics.current_collector()
+
+    def submit(self, path, img):
+        self._slots.acquire()
+        try:
+            self._futures.append(_executor().submit(self._write, path, img))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _write(self, path, img):
+        try:
+            with metrics.collect(self._collector), metrics.stage("evidence_write"):
+                write_jpeg(path, img)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Wait for every submitted frame; raises the first write error.
+        """
+        futures, self._futures = self._futures, []
+        error = None
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import threading
+import time
+import traceback
+import uuid
+import zipfile
+
+import cv2
+
+import config
+import history_manager
+import metrics
+import result_cache
+from annotation import annotate
+from detection import run_inference_batch
+from media_processor import decode_upload, image_record
+
+# Bulk ingestion of still images for POST /upload/batch.
+#
+# Items come from the uploaded files and from the members of uploaded zip
+# archives, read one at a time from Starlette's spooled temp files. Only one
+# batch of images (BATCH_UPLOAD_SIZE) is decoded at any time, so memory use
+# doesn't grow with the number of items. Each batch is a single detector call
+# and a single history transaction. ingest() yields one result dict per item
+# as soon as its batch is done, then a summary.
+
+# Batch requests running at once; see reserve()
+_slots = threading.BoundedSemaphore(max(1, config.BATCH_UPLOAD_CONCURRENCY))
+
+
+class Slot:
+    """
+    A reserved place among the BATCH_UPLOAD_CONCURRENCY running requests.
+    release() may be called more than once.
+    """
+
+    def __init__(self):
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._held:
+                self._held = False
+                _slots.release()
+
+
+def reserve():
+    """
+    A Slot if another batch request may run now, else None. Never blocks, so a
+    burst of requests can't tie up the server's worker threads waiting.
+    """
+    if not _slots.acquire(blocking=False):
+        return None
+    return Slot()
+
+
+def _extension(name):
+    return name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+
+def _read_limited(fileobj, limit):
+    data = fileobj.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"File exceeds the {limit} byte image limit")
+    return data
+
+
+def iter_items(files):
+    """
+    Yield (name, bytes or None, error or None) for every image in the uploads.
+    Zip archives are expanded; their directories and non-image members are
+    reported as errors without being read.
+    """
+    for upload in files:
+        name = upload.filename or ""
+        upload.file.seek(0)
+        if _extension(name) == "zip":
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                yield name, None, "Not a valid zip archive"
+                continue
+            with archive:
+                for info in archive.infolist():
+                    member = f"{name}/{info.filename}"
+                    if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                        continue
+                    if _extension(info.filename) not in config.IMAGE_EXTENSIONS:
+                        yield member, None, "Unsupported file type"
+                    elif info.file_size > config.MAX_IMAGE_BYTES:
+                        yield member, None, f"File exceeds the {config.MAX_IMAGE_BYTES} byte image limit"
+                    else:
+                        try:
+                            with archive.open(info) as f:
+                                yield member, _read_limited(f, config.MAX_IMAGE_BYTES), None
+                        except (ValueError, zipfile.BadZipFile, OSError) as e:
+                            yield member, None, str(e)
+        elif _extension(name) in config.IMAGE_EXTENSIONS:
+            try:
+                yield name, _read_limited(upload.file, config.MAX_IMAGE_BYTES), None
+            except ValueError as e:
+                yield name, None, str(e)
+        else:
+            yield name, None, "Unsupported file type"
+
+
+def ingest(files, batch_size=None, source_id=None, roi=None):
+    """
+    Process every image in files (UploadFiles, possibly zip archives), all
+    from the camera source source_id / restricted to roi when given. Callers
+    reserve() a slot first.
+    Yields:
+        Per item {"index", "filename", "status", "cached", "result" | "error"},
+        then a final {"summary": {...}}
+    """
+    batch_size = max(1, batch_size or config.BATCH_UPLOAD_SIZE)
+    started = time.perf_counter()
+    counts = {"completed": 0, "cached": 0, "failed": 0}
+
+    pending = []
+    for index, (name, data, error) in enumerate(iter_items(files)):
+        if error:
+            counts["failed"] += 1
+            yield _failed(index, name, error)
+            continue
+
+        key = None
+        if config.CACHE_ENABLED:
+            key = result_cache.cache_key(hashlib.sha256(data).hexdigest(), source_id, roi.key if roi else None)
+            cached = result_cache.lookup(key)
+            metrics.CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+            if cached:
+                counts["cached"] += 1
+                yield {"index": index, "filename": name, "status": "completed", "cached": True, "result": cached}
+                continue
+
+        pending.append((index, name, data, key))
+        if len(pending) >= batch_size:
+            yield from _process_batch(pending, counts, source_id, roi)
+            pending = []
+    if pending:
+        yield from _process_batch(pending, counts, source_id, roi)
+
+    yield {"summary": dict(counts, total=sum(counts.values()), seconds=round(time.perf_counter() - started, 3))}
+
+
+def _failed(index, name, error):
+    metrics.JOBS.inc(kind="batch_item", status="failed")
+    return {"index": index, "filename": name, "status": "failed", "cached": False, "error": error}
+
+
+def _remove_quietly(path):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def _store_batch(decoded, source_id=None, roi=None):
+    """
+    One detector call for the decoded images, their annotated copies, and one
+    history transaction. Returns (index, name, cache key, record) per image.
+    """
+    detections_per_image = run_inference_batch(
+        [image for *_, image in decoded], roi=roi, tiled=config.TILED_INFERENCE
+    )
+
+    records = []
+    for (index, name, key, file_id, filename, image), detections in zip(decoded, detections_per_image):
+        annotated = annotate(image, detections)
+        with metrics.stage("image_write"):
+            cv2.imwrite(os.path.join(config.RESULTS_DIR, f"annotated_{filename}"), annotated)
+        records.append((index, name, key, image_record(file_id, filename, detections, source_id)))
+
+    # One transaction for the whole batch
+    with metrics.stage("history_write"):
+        history_manager.add_records([record for *_, record in records])
+    return records
+
+
+def _process_batch(pending, counts, source_id=None, roi=None):
+    decoded = []
+    failures = []
+    for index, name, data, key in pending:
+        file_id = str(uuid.uuid4())
+        filename = f"{file_id}.{_extension(name)}"
+        try:
+            decoded.append((index, name, key, file_id, filename, decode_upload(data, filename)))
+        except ValueError as e:
+            failures.append(_failed(index, name, str(e)))
+    pending.clear()  # Drop the raw bytes; only decoded frames are needed from here
+
+    records = []
+    if decoded:
+        try:
+            records = _store_batch(decoded, source_id, roi)
+        except Exception as e:
+            # The whole batch failed (detector, disk, history write); the stream goes on
+            traceback.print_exc()
+            for index, name, _, _, filename, _ in decoded:
+                _remove_quietly(os.path.join(config.RESULTS_DIR, f"annotated_{filename}"))
+                failures.append(_failed(index, name, f"Batch failed: {e}"))
+
+    try:
+        result_cache.store_many([(key, record) for _, _, key, record in records if key])
+    except Exception as e:
+        print(f"Could not cache batch results: {e}")
+
+    counts["failed"] += len(failures)
+    counts["completed"] += len(records)
+    metrics.JOBS.inc(len(records), kind="batch_item", status="completed")
+    results = failures + [
+        {"index": index, "filename": name, "status": "completed", "cached": False, "result": record}
+        for index, name, _, record in records
+    ]
+    return sorted(results, key=lambda item: item["index"])
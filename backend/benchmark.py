@@ -0,0 +1,601 @@
+"""
+Synthetic benchmarks for the detection, video, history and report paths.
+
+Runs offline: a stub detector and OCR reader stand in for best.pt / EasyOCR,
+with configurable simulated latency, so the numbers measure EcoScout's own
+overhead (decode, preprocessing, batching, tracking, encoding, storage,
+reporting). Results are written as JSON; pass --compare to diff two runs.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --only video history --video-frames 600 --width 1920 --height 1080
+    python benchmark.py --only video --video-frames 3000 --segment-workers 4
+    python benchmark.py --compare baseline.json bench.json
+    python benchmark.py --real-models --only backends --backends ultralytics onnx onnx-int8
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SECTIONS = ("inference", "backends", "preprocess", "video", "history", "report")
+
+# Stub detector classes, keyed by the colour the synthetic scenes draw them in (BGR)
+STUB_CLASSES = {0: "car", 1: "smoke", 2: "littering"}
+_CLASS_COLORS = {0: (200, 60, 30), 1: (130, 130, 130), 2: (40, 200, 40)}
+
+
+# ---------------------------------------------------------------------------
+# Stub models
+# ---------------------------------------------------------------------------
+
+class StubDetector:
+    """
+    A detector backend (see inference_backends) that finds the coloured objects
+    drawn by the synthetic scene generator and sleeps to simulate the forward pass.
+    """
+
+    name = "stub"
+    thread_safe = False
+    names = STUB_CLASSES
+
+    def __init__(self, call_latency=0.0, image_latency=0.0):
+        self.call_latency = call_latency
+        self.image_latency = image_latency
+
+    def load(self):
+        pass
+
+    def predict(self, images):
+        import cv2
+        import numpy as np
+
+        time.sleep(self.call_latency + self.image_latency * len(images))
+
+        results = []
+        for img in images:
+            small = cv2.resize(img, (img.shape[1] // 4, img.shape[0] // 4), interpolation=cv2.INTER_NEAREST)
+            boxes = []
+            for cls, color in _CLASS_COLORS.items():
+                mask = cv2.inRange(small, np.array(color) - 10, np.array(color) + 10)
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                for contour in contours:
+                    x, y, w, h = cv2.boundingRect(contour)
+                    if w * h < 4:
+                        continue
+                    boxes.append([x * 4, y * 4, (x + w) * 4, (y + h) * 4, 0.85, cls])
+            results.append(np.array(boxes, dtype=np.float32).reshape(-1, 6))
+        return results
+
+
+class StubReader:
+    """
+    Stands in for easyocr.Reader with a fixed plate read and simulated latency.
+    """
+
+    def __init__(self, crop_latency=0.0):
+        self.crop_latency = crop_latency
+
+    def _read(self, img):
+        h, w = img.shape[:2]
+        return [([[0, 0], [w, 0], [w, h], [0, h]], "ABC1234", 0.9)]
+
+    def readtext(self, img, **kwargs):
+        time.sleep(self.crop_latency)
+        return self._read(img)
+
+    def readtext_batched(self, images, **kwargs):
+        time.sleep(self.crop_latency * len(images))
+        return [self._read(img) for img in images]
+
+
+def install_stubs(call_latency, image_latency, ocr_latency):
+    """
+    Put the stub models into this process's registry (also used as the
+    initializer of video segment worker processes).
+    """
+    from model_registry import registry
+
+    registry.install(StubDetector(call_latency, image_latency), StubReader(ocr_latency))
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def synthetic_scene(width, height, objects, seed=0):
+    """
+    A road-like frame with `objects` coloured boxes (vehicles, smoke, litter).
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 60, dtype=np.uint8)
+    img += rng.integers(0, 12, size=img.shape, dtype=np.uint8)
+    for i in range(objects):
+        cls = i % len(_CLASS_COLORS)
+        w = int(width * rng.uniform(0.08, 0.2))
+        h = int(height * rng.uniform(0.08, 0.2))
+        x = int(rng.integers(0, max(1, width - w)))
+        y = int(rng.integers(0, max(1, height - h)))
+        cv2.rectangle(img, (x, y), (x + w, y + h), _CLASS_COLORS[cls], -1)
+        if cls == 0:
+            # Plate-like patch on vehicles
+            cv2.rectangle(img, (x + w // 3, y + h - h // 4), (x + 2 * w // 3, y + h - 2), (255, 255, 255), -1)
+    return img
+
+
+def synthetic_video(path, width, height, frames, fps=25, objects=3):
+    """
+    Writes a clip of objects drifting across the frame, with a static stretch
+    in the middle third so adaptive sampling has something to skip.
+    """
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.full((height, width, 3), 60, dtype=np.uint8)
+    pause_start, pause_end = frames // 3, 2 * frames // 3
+    for f in range(frames):
+        img = background.copy()
+        # Objects freeze during the pause, then carry on from where they stopped
+        t = min(f, pause_start) + max(0, f - pause_end)
+        for i in range(objects):
+            cls = i % len(_CLASS_COLORS)
+            w, h = width // 8, height // 8
+            x = int((i * width / objects + t * width / 200.0) % max(1, width - w))
+            y = int(height * (0.2 + 0.6 * i / max(1, objects)))
+            cv2.rectangle(img, (x, y), (x + w, y + h), _CLASS_COLORS[cls], -1)
+        writer.write(img)
+    writer.release()
+
+
+def synthetic_record(i, detections, video=False):
+    record = {
+        "id": f"bench-{i:07d}",
+        "status": "success",
+        "timestamp": datetime(2025, 1, 1 + i % 28, i % 24, i % 60, i % 60).isoformat(),
+        "original_file": f"bench-{i:07d}.{'mp4' if video else 'jpg'}",
+        "detections": [
+            {
+                "violation_type": STUB_CLASSES[j % 3],
+                "confidence": 80.0 + j % 20,
+                "bbox": [10, 20, 110, 120],
+                "license_plate": f"PLT{(i * 31 + j) % 10000:04d}" if j % 3 == 0 else "N/A",
+                "ocr_confidence": 75.0 if j % 3 == 0 else 0.0,
+                "frame": j * 5,
+                "timestamp": j * 0.2,
+            }
+            for j in range(detections)
+        ],
+    }
+    if video:
+        record["annotated_video_url"] = f"http://localhost:8000/results/annotated_{record['original_file']}"
+    else:
+        record["annotated_image_url"] = f"http://localhost:8000/results/annotated_{record['original_file']}"
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Measurement helpers
+# ---------------------------------------------------------------------------
+
+def summarize(samples, items_per_sample=1):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "throughput_per_s": round(len(samples) * items_per_sample / total, 2) if total > 0 else None,
+    }
+
+
+def timed(func, runs, *args, **kwargs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+class _BenchJob:
+    """
+    Minimal stand-in for job_manager.Job when calling job functions directly.
+    """
+
+    def check_cancelled(self):
+        pass
+
+    def update_progress(self, frames_done, frames_total=None):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def bench_inference(args, workdir):
+    from detection import run_inference, run_inference_batch
+
+    images = [synthetic_scene(args.width, args.height, args.objects, seed=i) for i in range(args.images)]
+    output_path = os.path.join(workdir, "annotated.jpg")
+
+    single = []
+    for img in images:
+        t0 = time.perf_counter()
+        run_inference(img, output_path)
+        single.append(time.perf_counter() - t0)
+
+    batched = []
+    for i in range(0, len(images), args.batch_size):
+        batch = images[i:i + args.batch_size]
+        t0 = time.perf_counter()
+        run_inference_batch(batch)
+        batched.append(time.perf_counter() - t0)
+
+    return {
+        "resolution": [args.width, args.height],
+        "objects_per_image": args.objects,
+        "run_inference": summarize(single),
+        "run_inference_batch": dict(summarize(batched, items_per_sample=args.batch_size), batch_size=args.batch_size),
+    }
+
+
+def _agreement(reference, boxes, min_iou=0.5):
+    """
+    Fraction of reference boxes matched by a box of the same class.
+    """
+    from tracker import iou
+
+    if len(reference) == 0:
+        return 1.0 if len(boxes) == 0 else 0.0
+    matched = sum(
+        1 for ref in reference
+        if any(int(b[5]) == int(ref[5]) and iou(ref[:4], b[:4]) >= min_iou for b in boxes)
+    )
+    return matched / len(reference)
+
+
+def bench_backends(args, workdir):
+    """
+    Load time, latency and agreement with the first backend for each detector
+    backend, on the same images. Needs best.pt and the backend frameworks.
+    """
+    import config
+    from inference_backends import create_backend
+    from model_registry import registry
+
+    if not args.real_models:
+        return {"skipped": "needs --real-models"}
+
+    images = [synthetic_scene(args.width, args.height, args.objects, seed=i) for i in range(args.images)]
+    results = {}
+    reference = None
+    for spec in args.backends:
+        name, quantize = ("onnx", True) if spec == "onnx-int8" else (spec, False)
+        backend = create_backend(
+            name, registry.model_path, imgsz=config.INFERENCE_IMAGE_SIZE,
+            conf=config.DETECTION_CONFIDENCE, iou=config.NMS_IOU_THRESHOLD,
+            intra_op_threads=config.INFERENCE_INTRA_OP_THREADS,
+            inter_op_threads=config.INFERENCE_INTER_OP_THREADS, quantize=quantize
+        )
+        try:
+            t0 = time.perf_counter()
+            backend.load()
+            load_seconds = time.perf_counter() - t0
+            backend.predict(images[:1])  # Warm-up
+
+            outputs = []
+            single = []
+            for img in images:
+                t0 = time.perf_counter()
+                outputs.extend(backend.predict([img]))
+                single.append(time.perf_counter() - t0)
+            batched = []
+            for i in range(0, len(images), args.batch_size):
+                t0 = time.perf_counter()
+                backend.predict(images[i:i + args.batch_size])
+                batched.append(time.perf_counter() - t0)
+        except Exception as e:
+            results[spec] = {"error": str(e)}
+            continue
+
+        if reference is None:
+            reference = outputs
+        results[spec] = {
+            "load_seconds": round(load_seconds, 3),
+            "single": summarize(single),
+            "batched": dict(summarize(batched, items_per_sample=args.batch_size), batch_size=args.batch_size),
+            "boxes": int(sum(len(o) for o in outputs)),
+            "agreement": round(statistics.mean(_agreement(r, o) for r, o in zip(reference, outputs)), 4),
+        }
+    return results
+
+
+def bench_preprocess(args, workdir):
+    from utils import preprocess_plate
+
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for w, h in ((120, 40), (240, 80), (480, 160)):
+        crops = [rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8) for _ in range(20)]
+        samples = []
+        for _ in range(max(1, args.runs // 20)):
+            for crop in crops:
+                t0 = time.perf_counter()
+                preprocess_plate(crop)
+                samples.append(time.perf_counter() - t0)
+        results[f"{w}x{h}"] = summarize(samples)
+    return results
+
+
+def gate_sampling(video_path, frames):
+    """
+    Runs the configured FrameGate over a synthetic_video clip and compares the
+    sampling of its moving thirds with its static middle third.
+    Returns:
+        Mean gap between inferred frames per span, and whether motion sampled denser
+    """
+    import cv2
+
+    import config
+    from frame_gate import FrameGate
+
+    gate = FrameGate(
+        min_interval=config.SAMPLE_MIN_INTERVAL_FRAMES,
+        max_interval=config.SAMPLE_MAX_INTERVAL_FRAMES,
+        motion_threshold=config.MOTION_THRESHOLD,
+        scene_change_threshold=config.SCENE_CHANGE_THRESHOLD,
+        pixel_threshold=config.MOTION_PIXEL_THRESHOLD
+    )
+    pause_start, pause_end = frames // 3, 2 * frames // 3
+    picked = {"moving": 0, "static": 0}
+    cap = cv2.VideoCapture(video_path)
+    index = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if gate(frame, index):
+            # The first frame after the pause still differs from the last pick, so count it as static
+            picked["static" if pause_start < index <= pause_end else "moving"] += 1
+        index += 1
+    cap.release()
+
+    spans = {"moving": index - (pause_end - pause_start), "static": pause_end - pause_start}
+    intervals = {name: round(spans[name] / max(1, picked[name]), 2) for name in spans}
+    return {
+        "inferred": picked,
+        "moving_interval": intervals["moving"],
+        "static_interval": intervals["static"],
+        "motion_denser": intervals["moving"] < intervals["static"],
+    }
+
+
+def bench_video(args, workdir):
+    import media_processor
+
+    video_path = os.path.join(workdir, "synthetic.mp4")
+    t0 = time.perf_counter()
+    synthetic_video(video_path, args.width, args.height, args.video_frames, objects=args.objects)
+    generate_seconds = time.perf_counter() - t0
+
+    sampling = gate_sampling(video_path, args.video_frames)
+    if not sampling["motion_denser"]:
+        print(f"  WARNING: frame gate samples motion no denser than static footage: {sampling}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    result = media_processor.process_video(_BenchJob(), "bench-video", "synthetic.mp4", video_path)
+    wall = time.perf_counter() - t0
+
+    return {
+        "resolution": [args.width, args.height],
+        "frames": args.video_frames,
+        "segment_workers": args.segment_workers,
+        "generate_seconds": round(generate_seconds, 3),
+        "wall_seconds": round(wall, 3),
+        "fps": round(args.video_frames / wall, 2) if wall > 0 else None,
+        "events": len(result["detections"]),
+        "sampling": sampling,
+        "performance": result.get("performance"),
+    }
+
+
+def bench_history(args, workdir):
+    import history_manager
+
+    n = args.records
+    records = [synthetic_record(i, args.detections_per_record, video=i % 10 == 0) for i in range(n)]
+
+    results = {"records": n, "detections_per_record": args.detections_per_record}
+
+    t0 = time.perf_counter()
+    history_manager.add_records(records)
+    results["bulk_insert_seconds"] = round(time.perf_counter() - t0, 3)
+
+    extra = [synthetic_record(n + i, args.detections_per_record) for i in range(100)]
+    samples = []
+    for record in extra:
+        t0 = time.perf_counter()
+        history_manager.add_record(record)
+        samples.append(time.perf_counter() - t0)
+    results["add_record"] = summarize(samples)
+
+    results["first_page"] = summarize(timed(lambda: history_manager.query_records(limit=50), 20))
+    results["deep_page"] = summarize(timed(lambda: history_manager.query_records(limit=50, offset=n - 100), 20))
+    results["filter_type"] = summarize(timed(lambda: history_manager.query_records(limit=50, violation_type="smoke"), 20))
+    results["filter_plate"] = summarize(timed(lambda: history_manager.query_records(limit=50, plate="PLT12"), 20))
+    results["filter_dates"] = summarize(timed(
+        lambda: history_manager.query_records(limit=50, start="2025-01-05", end="2025-01-10"), 20))
+
+    ids = [r["id"] for r in records[:: max(1, n // 100)]]
+    results["get_record"] = summarize(timed(lambda: [history_manager.get_record(i) for i in ids], 5), len(ids))
+    results["get_records_by_ids"] = summarize(timed(lambda: history_manager.get_records_by_ids(ids), 5))
+
+    t0 = time.perf_counter()
+    history_manager.delete_records([r["id"] for r in extra])
+    results["delete_100_seconds"] = round(time.perf_counter() - t0, 3)
+    return results
+
+
+def bench_report(args, workdir):
+    import cv2
+    from report_generator import generate_pdf_report
+
+    import config
+
+    results = {}
+    image_name = "annotated_bench.jpg"
+    cv2.imwrite(os.path.join(config.RESULTS_DIR, image_name), synthetic_scene(args.width, args.height, args.objects))
+    for rows in args.report_rows:
+        record = synthetic_record(rows, rows)
+        record["annotated_image_url"] = f"http://localhost:8000/results/{image_name}"
+        output_path = os.path.join(workdir, f"report_{rows}.pdf")
+        samples = timed(generate_pdf_report, 3, record, output_path)
+        results[f"{rows}_rows"] = dict(summarize(samples), pdf_bytes=os.path.getsize(output_path))
+    return results
+
+
+BENCHMARKS = {
+    "inference": bench_inference,
+    "backends": bench_backends,
+    "preprocess": bench_preprocess,
+    "video": bench_video,
+    "history": bench_history,
+    "report": bench_report,
+}
+
+
+# ---------------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------------
+
+def _flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline_path, current_path):
+    with open(baseline_path) as f:
+        baseline = _flatten(json.load(f)["results"])
+    with open(current_path) as f:
+        current = _flatten(json.load(f)["results"])
+
+    print(f"{'metric':70} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(set(baseline) & set(current)):
+        if not (name.endswith("_ms") or name.endswith("_seconds") or name.endswith("_per_s") or name.endswith("fps")):
+            continue
+        old, new = baseline[name], current[name]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{name:70} {old:>12} {new:>12} {change:>9}")
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EcoScout synthetic benchmarks")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=list(SECTIONS), help="Sections to run")
+    parser.add_argument("--output", default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Diff two result files and exit")
+    parser.add_argument("--real-models", action="store_true", help="Use best.pt / EasyOCR instead of stubs")
+    parser.add_argument("--backends", nargs="+", default=["ultralytics", "onnx", "onnx-int8"],
+                        help="Detector backends compared by the backends section (needs --real-models)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--objects", type=int, default=4, help="Objects per synthetic frame")
+    parser.add_argument("--images", type=int, default=20, help="Images for the inference benchmark")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=200, help="Iterations for micro-benchmarks")
+    parser.add_argument("--video-frames", type=int, default=300)
+    parser.add_argument("--segment-workers", type=int, default=0,
+                        help="Split the video benchmark across this many worker processes")
+    parser.add_argument("--records", type=int, default=10000, help="History records to insert")
+    parser.add_argument("--detections-per-record", type=int, default=20)
+    parser.add_argument("--report-rows", type=int, nargs="+", default=[10, 500, 2000])
+    parser.add_argument("--stub-call-ms", type=float, default=5.0, help="Simulated per-call detector latency")
+    parser.add_argument("--stub-image-ms", type=float, default=20.0, help="Simulated per-image detector latency")
+    parser.add_argument("--stub-ocr-ms", type=float, default=10.0, help="Simulated per-crop OCR latency")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Keep every artifact (results, uploads, history DB, sidecars, reports) out of the real data directories
+    workdir = tempfile.mkdtemp(prefix="ecoscout-bench-")
+    os.environ["ECOSCOUT_RESULTS_DIR"] = os.path.join(workdir, "results")
+    os.environ["ECOSCOUT_UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["ECOSCOUT_HISTORY_DB"] = os.path.join(workdir, "history.db")
+    os.environ["ECOSCOUT_DETECTIONS_DIR"] = os.path.join(workdir, "detections")
+    os.environ["ECOSCOUT_REPORTS_DIR"] = os.path.join(workdir, "reports")
+    os.environ.setdefault("ECOSCOUT_VIDEO_BATCH_SIZE", str(args.batch_size))
+    if args.segment_workers:
+        os.environ["ECOSCOUT_VIDEO_SEGMENT_WORKERS"] = str(args.segment_workers)
+        os.environ["ECOSCOUT_VIDEO_SEGMENT_MIN_FRAMES"] = str(max(1, args.video_frames // args.segment_workers))
+    os.makedirs(os.environ["ECOSCOUT_RESULTS_DIR"])
+    os.makedirs(os.environ["ECOSCOUT_UPLOAD_DIR"])
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from model_registry import registry
+    import video_segments
+
+    if args.real_models:
+        registry.load()
+    else:
+        stub_latency = (args.stub_call_ms / 1000.0, args.stub_image_ms / 1000.0, args.stub_ocr_ms / 1000.0)
+        install_stubs(*stub_latency)
+        video_segments.set_worker_initializer(install_stubs, *stub_latency)
+
+    results = {}
+    try:
+        for name in args.only:
+            print(f"Running {name} benchmark...", file=sys.stderr)
+            t0 = time.perf_counter()
+            results[name] = BENCHMARKS[name](args, workdir)
+            print(f"  done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    finally:
+        video_segments.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "models": "real" if args.real_models else "stub",
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+
+# Runtime settings for the EcoScout backend.
+# Every value can be overridden with an environment variable of the same name
+# prefixed with ECOSCOUT_ (e.g. ECOSCOUT_INFERENCE_WORKERS=4).
+
+
+def _env_int(name, default):
+    return int(os.environ.get(f"ECOSCOUT_{name}", default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(f"ECOSCOUT_{name}", default))
+
+
+def _env_bool(name, default):
+    value = os.environ.get(f"ECOSCOUT_{name}")
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_str(name, default):
+    return os.environ.get(f"ECOSCOUT_{name}", default)
+
+
+# Job queue / worker pool
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", 2)  # Concurrent inference jobs
+MAX_QUEUED_JOBS = _env_int("MAX_QUEUED_JOBS", 32)  # Uploads waiting for a worker
+MAX_FINISHED_JOBS = _env_int("MAX_FINISHED_JOBS", 256)  # Finished jobs kept for status polling
+
+# Storage
+UPLOAD_DIR = _env_str("UPLOAD_DIR", "uploads")
+RESULTS_DIR = _env_str("RESULTS_DIR", "results")
+HISTORY_DB = _env_str("HISTORY_DB", "history.db")  # SQLite detection history
+RESULTS_URL = _env_str("RESULTS_URL", "http://localhost:8000/results")  # Public URL of RESULTS_DIR
+DETECTIONS_DIR = _env_str("DETECTIONS_DIR", "detections")  # Per-frame video detections (.npz sidecars)
+REPORTS_DIR = _env_str("REPORTS_DIR", "reports")  # Cached PDF reports and exports (served only through the API)
+
+# Media types
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp')
+VIDEO_EXTENSIONS = ('mp4', 'avi', 'mov')
+
+# Video processing
+VIDEO_BATCH_SIZE = _env_int("VIDEO_BATCH_SIZE", 8)  # Sampled frames sent to YOLO per model call
+VIDEO_QUEUE_SIZE = _env_int("VIDEO_QUEUE_SIZE", 0)  # Max frames buffered per pipeline stage (0 = 2x VIDEO_BATCH_SIZE)
+VIDEO_SEGMENT_WORKERS = _env_int("VIDEO_SEGMENT_WORKERS", 0)  # Processes splitting long videos (0/1 = off)
+VIDEO_SEGMENT_MIN_FRAMES = _env_int("VIDEO_SEGMENT_MIN_FRAMES", 3000)  # Shortest frame range given its own process
+
+# Evidence frames (video)
+EVIDENCE_JPEG_QUALITY = _env_int("EVIDENCE_JPEG_QUALITY", 90)  # JPEG quality (0-100) of saved evidence frames
+EVIDENCE_MAX_PER_TRACK = _env_int("EVIDENCE_MAX_PER_TRACK", 3)  # Evidence frames per tracked object (0 = no limit)
+EVIDENCE_MAX_PER_SECOND = _env_int("EVIDENCE_MAX_PER_SECOND", 4)  # Evidence frames per second of video (0 = no limit)
+EVIDENCE_WRITER_THREADS = _env_int("EVIDENCE_WRITER_THREADS", 2)  # Threads encoding and writing evidence JPEGs
+EVIDENCE_MAX_PENDING = _env_int("EVIDENCE_MAX_PENDING", 16)  # Frames waiting to be written before the encoder waits
+
+# Cross-frame tracking (video)
+TRACK_IOU_THRESHOLD = _env_float("TRACK_IOU_THRESHOLD", 0.3)  # Min IoU to continue a track
+TRACK_MAX_CENTROID_DISTANCE = _env_float("TRACK_MAX_CENTROID_DISTANCE", 0.75)  # Fallback match, in box sizes
+TRACK_MAX_AGE_FRAMES = _env_int("TRACK_MAX_AGE_FRAMES", 30)  # Frames unseen before a track is closed
+OCR_REFRESH_INTERVAL_FRAMES = _env_int("OCR_REFRESH_INTERVAL_FRAMES", 50)  # Re-read a track's plate this often
+OCR_GOOD_CONFIDENCE = _env_float("OCR_GOOD_CONFIDENCE", 80.0)  # Plate reads at/above this (%) are not retried
+
+# Adaptive frame sampling (video)
+SAMPLE_MIN_INTERVAL_FRAMES = _env_int("SAMPLE_MIN_INTERVAL_FRAMES", 2)  # Densest sampling, during motion
+SAMPLE_MAX_INTERVAL_FRAMES = _env_int("SAMPLE_MAX_INTERVAL_FRAMES", 15)  # Sparsest sampling, on static footage
+MOTION_THRESHOLD = _env_float("MOTION_THRESHOLD", 0.02)  # Share of changed pixels (0-1) in any frame cell that counts as motion
+MOTION_PIXEL_THRESHOLD = _env_int("MOTION_PIXEL_THRESHOLD", 15)  # Gray-level change (0-255) that marks a pixel as changed
+SCENE_CHANGE_THRESHOLD = _env_float("SCENE_CHANGE_THRESHOLD", 0.4)  # Histogram delta (0-1) that forces inference
+
+# Models
+PRELOAD_MODELS = _env_bool("PRELOAD_MODELS", True)  # Load + warm up on API startup instead of first request
+USE_GPU = _env_bool("USE_GPU", False)  # Set if CUDA is available
+OCR_LANGUAGES = tuple(_env_str("OCR_LANGUAGES", "en").split(","))
+WARMUP_RUNS = _env_int("WARMUP_RUNS", 1)  # Dummy inferences after loading
+WARMUP_IMAGE_SIZE = _env_int("WARMUP_IMAGE_SIZE", 640)
+
+# Detector backend
+INFERENCE_BACKEND = _env_str("INFERENCE_BACKEND", "ultralytics")  # "ultralytics" (PyTorch) or "onnx" (ONNX Runtime)
+INFERENCE_IMAGE_SIZE = _env_int("INFERENCE_IMAGE_SIZE", 640)  # Model input size; smaller is faster, less accurate
+INFERENCE_INTRA_OP_THREADS = _env_int("INFERENCE_INTRA_OP_THREADS", 0)  # Threads inside one operator (0 = runtime default)
+INFERENCE_INTER_OP_THREADS = _env_int("INFERENCE_INTER_OP_THREADS", 0)  # Operators run in parallel (0 = runtime default)
+DETECTION_CONFIDENCE = _env_float("DETECTION_CONFIDENCE", 0.25)  # Min box score (0-1)
+NMS_IOU_THRESHOLD = _env_float("NMS_IOU_THRESHOLD", 0.7)
+ONNX_MODEL_PATH = _env_str("ONNX_MODEL_PATH", "")  # Exported model; default best.onnx next to best.pt
+ONNX_QUANTIZE = _env_bool("ONNX_QUANTIZE", False)  # Dynamic int8 quantization of the ONNX weights
+
+# Tiled inference (still images)
+TILED_INFERENCE = _env_bool("TILED_INFERENCE", False)  # Detect small objects in large stills tile by tile
+TILE_MIN_IMAGE_SIZE = _env_int("TILE_MIN_IMAGE_SIZE", 1920)  # Longer side (px) above which an image is tiled
+TILE_SIZE = _env_int("TILE_SIZE", INFERENCE_IMAGE_SIZE)  # Tile side (px); the model input size avoids resampling
+TILE_OVERLAP = _env_float("TILE_OVERLAP", 0.2)  # Fraction of a tile shared with its neighbour
+TILE_BATCH_SIZE = _env_int("TILE_BATCH_SIZE", 8)  # Tiles per detector call (bounds peak memory)
+TILE_WORKERS = _env_int("TILE_WORKERS", 1)  # Tile batches run in parallel (useful with the onnx backend)
+TILE_FULL_FRAME_PASS = _env_bool("TILE_FULL_FRAME_PASS", True)  # Also detect on the whole image, for large objects
+TILE_MERGE_CONTAINMENT = _env_float("TILE_MERGE_CONTAINMENT", 0.8)  # Drop a box this much inside a better one
+
+# Plate OCR
+# Classes whose boxes are sent to OCR ("*" = every class)
+OCR_CLASSES = tuple(c.strip().lower() for c in _env_str(
+    "OCR_CLASSES", "car,vehicle,truck,bus,van,motorcycle,motorbike,rickshaw,license_plate,licence_plate,number_plate,plate"
+).split(",") if c.strip())
+OCR_BATCH_SIZE = _env_int("OCR_BATCH_SIZE", 16)  # Crops per EasyOCR recognizer batch
+
+# Live streams
+STREAM_MAX_SESSIONS = _env_int("STREAM_MAX_SESSIONS", 4)  # Sources monitored at once
+STREAM_MAX_FINISHED_SESSIONS = _env_int("STREAM_MAX_FINISHED_SESSIONS", 20)  # Ended sessions kept for status polling
+STREAM_RECONNECT_SECONDS = _env_float("STREAM_RECONNECT_SECONDS", 2.0)  # Wait before reopening a dropped live source
+STREAM_STATS_INTERVAL_SECONDS = _env_float("STREAM_STATS_INTERVAL_SECONDS", 1.0)  # How often stats are pushed
+STREAM_CLIENT_QUEUE_SIZE = _env_int("STREAM_CLIENT_QUEUE_SIZE", 100)  # Messages buffered per WebSocket client
+
+# Duplicate-upload result cache
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", True)
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 10000)
+
+# Reports
+REPORT_MAX_THUMBNAILS = _env_int("REPORT_MAX_THUMBNAILS", 60)  # Evidence frames shown per video record
+REPORT_EXPORT_PAGE_SIZE = _env_int("REPORT_EXPORT_PAGE_SIZE", 100)  # Records loaded from history at a time
+REPORT_MAX_EXPORTS = _env_int("REPORT_MAX_EXPORTS", 20)  # Finished export files kept on disk
+REPORT_EXPORT_IMAGE_WIDTH = _env_int("REPORT_EXPORT_IMAGE_WIDTH", 480)  # Annotated images are embedded this wide in exports
+REPORT_EXPORT_RECORDS_PER_FILE = _env_int("REPORT_EXPORT_RECORDS_PER_FILE", 100)  # Larger PDF exports become a zip of parts
+EXPORT_WORKERS = _env_int("EXPORT_WORKERS", 1)  # Export jobs run on their own workers, never blocking uploads
+MAX_QUEUED_EXPORTS = _env_int("MAX_QUEUED_EXPORTS", 8)  # Exports waiting for an export worker
+
+# Uploads
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 2 * 1024 ** 3)  # Any upload (checked on Content-Length and while streaming)
+MAX_IMAGE_BYTES = _env_int("MAX_IMAGE_BYTES", 50 * 1024 ** 2)  # Images are held in memory
+UPLOAD_CHUNK_SIZE = _env_int("UPLOAD_CHUNK_SIZE", 1024 ** 2)
+KEEP_ORIGINAL_UPLOADS = _env_bool("KEEP_ORIGINAL_UPLOADS", True)  # Also store original images in UPLOAD_DIR
+BATCH_UPLOAD_SIZE = _env_int("BATCH_UPLOAD_SIZE", 16)  # Images decoded and inferred together by /upload/batch
+BATCH_UPLOAD_CONCURRENCY = _env_int("BATCH_UPLOAD_CONCURRENCY", 1)  # /upload/batch requests processed at once
@@ -1,97 +1,182 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-import easyocr
 import numpy as np
-from ultralytics import YOLO
-from utils import preprocess_plate
-import os
 
-# Initialize EasyOCR reader
-reader = easyocr.Reader(['en'], gpu=False) # Set gpu=True if CUDA is available
+import config
+import metrics
+from annotation import annotate
+from model_registry import registry
+from ocr_engine import apply_plates
+from tiling import merge_boxes, tile_rects
 
-# Load YOLO model
-# Assuming best.pt is in the root directory of the project, relative to where main.py is run
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 'best.pt')
+# YOLO and EasyOCR are owned by model_registry and load on first use
+# (or at API startup), not at import time.
 
-print(f"Loading model from: {MODEL_PATH}")
-model = YOLO(MODEL_PATH)
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
 
-def run_inference(image_input, output_path=None):
+def run_inference(image_input, output_path=None, roi=None, tiled=None):
     """
     Run YOLO detection and EasyOCR on the input image.
     Args:
         image_input: Path to image (str) or image array (numpy.ndarray)
         output_path: Path to save annotated image (optional)
+        roi: RegionOfInterest to restrict detection to (optional)
+        tiled: Detect tile by tile if the image is large (default: ECOSCOUT_TILED_INFERENCE)
     Returns:
         List of detection records
     """
     if isinstance(image_input, str):
-        img = cv2.imread(image_input)
+        with metrics.stage("image_decode"):
+            img = cv2.imread(image_input)
     else:
-        img = image_input.copy()
-        
-    results = model(img)
-    
-    detection_records = []
-    
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            # Get bounding box coordinates
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-            conf = float(box.conf[0].cpu().numpy())
-            cls = int(box.cls[0].cpu().numpy())
-            label = model.names[cls]
-            
-            record = {
-                "violation_type": label,
-                "confidence": round(conf * 100, 2),
-                "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                "license_plate": "N/A",
-                "ocr_confidence": 0.0
-            }
-            
-            # Draw bounding box
-            color = (0, 255, 0) # Green
-            if label.lower() in ['littering', 'smoke']: # Highlight violations
-                color = (0, 0, 255) # Red
-            
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(img, f"{label} {conf:.2f}", (x1, y1 - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-            
-            # OCR Processing
-            # We attempt OCR on the cropped region if it's a vehicle or if we suspect a plate
-            # For robustness, we'll try on all detections but filter by confidence
-            
-            crop = img[y1:y2, x1:x2]
-            if crop.size > 0:
-                processed_crop = preprocess_plate(crop)
-                if processed_crop is not None:
-                    ocr_result = reader.readtext(processed_crop, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
-                    
-                    if ocr_result:
-                        # Sort results by x-coordinate (left to right)
-                        ocr_result.sort(key=lambda x: x[0][0][0])
-                        
-                        # Concatenate all detected text segments
-                        full_text = " ".join([res[1] for res in ocr_result])
-                        
-                        # Calculate average confidence
-                        avg_conf = sum([res[2] for res in ocr_result]) / len(ocr_result)
-                        
-                        # Stricter threshold for OCR
-                        if avg_conf > 0.4 and len(full_text) > 3: 
-                            record["license_plate"] = full_text
-                            record["ocr_confidence"] = round(avg_conf * 100, 2)
-                            
-                            # Draw plate text
-                            cv2.putText(img, f"Plate: {full_text}", (x1, y2 + 20), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-
-            detection_records.append(record)
+        img = image_input
+
+    detection_records = _detect([img], roi, config.TILED_INFERENCE if tiled is None else tiled)[0]
+
+    # Plates are cropped from the clean image, before anything is drawn
+    apply_plates([img], [detection_records])
 
     # Save annotated image if output_path is provided
     if output_path:
-        cv2.imwrite(output_path, img)
-    
+        annotated = annotate(img, detection_records)
+        with metrics.stage("image_write"):
+            cv2.imwrite(output_path, annotated)
+
+    return detection_records
+
+def run_inference_batch(frames, ocr=True, roi=None, tiled=False):
+    """
+    Run YOLO detection on several frames in a single model call.
+    Args:
+        frames: List of image arrays (numpy.ndarray). They are not modified.
+        ocr: Read license plates of plate-class boxes in one batched OCR pass.
+             Pass False when the caller decides itself which boxes need OCR
+             (see ocr_engine.read_plates).
+        roi: RegionOfInterest to restrict detection to (optional)
+        tiled: Detect large frames tile by tile (see _predict_tiled)
+    Returns:
+        List of detection record lists, one per input frame (same order)
+    """
+    if not frames:
+        return []
+
+    detections_per_frame = _detect(list(frames), roi, tiled)
+    if ocr:
+        apply_plates(frames, detections_per_frame)
+    return detections_per_frame
+
+def _detect(frames, roi=None, tiled=False):
+    """
+    One detector call for all frames. With a region of interest, only the
+    polygon's bounding rectangle is sent to the model; boxes are shifted back
+    to full-frame coordinates and those centred outside the polygon dropped.
+    With tiled, frames larger than TILE_MIN_IMAGE_SIZE are detected tile by tile.
+    """
+    offsets = []
+    if roi is not None:
+        crops = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            x1, y1, x2, y2 = roi.crop_rect(w, h)
+            crops.append(frame[y1:y2, x1:x2])
+            offsets.append((x1, y1))
+        frames_in = crops
+    else:
+        frames_in = frames
+
+    results = [None] * len(frames_in)
+    if tiled:
+        for i, frame in enumerate(frames_in):
+            if max(frame.shape[:2]) > config.TILE_MIN_IMAGE_SIZE:
+                results[i] = _predict_tiled(frame)
+    single = [i for i, result in enumerate(results) if result is None]
+    if single:
+        with metrics.stage("yolo_forward"):
+            for i, result in zip(single, registry.predict([frames_in[i] for i in single])):
+                results[i] = result
+
+    # One result per input image, in input order
+    detections_per_frame = [_records_from_result(result) for result in results]
+    if roi is None:
+        return detections_per_frame
+
+    kept_per_frame = []
+    for frame, (dx, dy), detections in zip(frames, offsets, detections_per_frame):
+        h, w = frame.shape[:2]
+        kept = []
+        for d in detections:
+            x1, y1, x2, y2 = d["bbox"]
+            d["bbox"] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+            if roi.contains(d["bbox"], w, h):
+                kept.append(d)
+        kept_per_frame.append(kept)
+    return kept_per_frame
+
+def _tile_executor():
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            _tile_pool = ThreadPoolExecutor(max_workers=config.TILE_WORKERS, thread_name_prefix="tile")
+        return _tile_pool
+
+def _predict_tiled(img):
+    """
+    Detect on overlapping TILE_SIZE tiles so small objects keep their pixels,
+    then merge the boxes with NMS. Tiles are views into img and go to the model
+    TILE_BATCH_SIZE at a time (across TILE_WORKERS threads), which bounds peak
+    memory whatever the image size.
+    Returns:
+        (N, 6) array of [x1, y1, x2, y2, conf, cls] in img coordinates
+    """
+    h, w = img.shape[:2]
+    rects = tile_rects(w, h, config.TILE_SIZE, config.TILE_OVERLAP)
+    batches = [rects[i:i + config.TILE_BATCH_SIZE] for i in range(0, len(rects), config.TILE_BATCH_SIZE)]
+
+    def run(batch):
+        outputs = registry.predict([img[y1:y2, x1:x2] for x1, y1, x2, y2 in batch])
+        for (x1, y1, _, _), boxes in zip(batch, outputs):
+            boxes[:, [0, 2]] += x1
+            boxes[:, [1, 3]] += y1
+        return outputs
+
+    with metrics.stage("yolo_forward_tiled"):
+        if config.TILE_WORKERS > 1 and len(batches) > 1:
+            per_batch = list(_tile_executor().map(run, batches))
+        else:
+            per_batch = [run(batch) for batch in batches]
+        boxes = [b for outputs in per_batch for b in outputs]
+        if config.TILE_FULL_FRAME_PASS:
+            # Objects larger than a tile are only seen whole at full-frame scale
+            boxes.extend(registry.predict([img]))
+
+    with metrics.stage("tile_merge"):
+        merged = merge_boxes(np.concatenate(boxes) if boxes else np.zeros((0, 6), dtype=np.float32),
+                             config.NMS_IOU_THRESHOLD, config.TILE_MERGE_CONTAINMENT)
+    return merged
+
+def _records_from_result(result):
+    """
+    Turn one backend result, an (N, 6) array of [x1, y1, x2, y2, conf, cls],
+    into detection records (plates unread).
+    """
+    detection_records = []
+    names = registry.names
+    for row in result:
+        # Get bounding box coordinates
+        x1, y1, x2, y2 = row[:4].astype(int)
+        conf = float(row[4])
+        cls = int(row[5])
+        label = names[cls]
+
+        detection_records.append({
+            "violation_type": label,
+            "confidence": round(conf * 100, 2),
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "license_plate": "N/A",
+            "ocr_confidence": 0.0
+        })
+
     return detection_records
@@ -0,0 +1,178 @@
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+# Per-frame detections of processed videos, kept out of the history database.
+#
+# A video's history record holds one event per tracked object; every box the
+# detector produced on every inferred frame goes into an .npz sidecar in
+# DETECTIONS_DIR instead, one array per field, sorted by frame. A frame range
+# is found with a binary search on the frame column and only that slice is
+# turned into dicts, so serving a page costs the same for any video length.
+
+_cache = OrderedDict()  # path -> (mtime, columns); the few most recently read sidecars
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 4
+
+
+def sidecar_path(record_id):
+    return os.path.join(config.DETECTIONS_DIR, f"detections_{record_id}.npz")
+
+
+class FrameDetections:
+    """
+    Column builder for the detections of one video (or one segment of it).
+    Typed arrays keep a long video's boxes compact while they accumulate, and
+    pickle cheaply back from the segment worker processes.
+    """
+
+    def __init__(self):
+        self.frames = array("i")
+        self.track_ids = array("i")
+        self.class_ids = array("h")
+        self.confidences = array("f")
+        self.boxes = array("i")  # x1, y1, x2, y2 per detection
+        self.classes = []
+        self._class_index = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _class_id(self, name):
+        if name not in self._class_index:
+            self._class_index[name] = len(self.classes)
+            self.classes.append(name)
+        return self._class_index[name]
+
+    def add(self, frame_index, detections):
+        """
+        Append the tracked detections (with track_id set) of one frame.
+        """
+        for d in detections:
+            self.frames.append(frame_index)
+            self.track_ids.append(d.get("track_id", 0))
+            self.class_ids.append(self._class_id(d["violation_type"]))
+            self.confidences.append(d["confidence"])
+            self.boxes.extend(int(v) for v in d["bbox"])
+
+    def extend(self, other, track_map=None):
+        """
+        Append another builder's rows (a later segment), renumbering its
+        track ids through track_map.
+        """
+        class_map = [self._class_id(name) for name in other.classes]
+        self.frames.extend(other.frames)
+        if track_map:
+            self.track_ids.extend(track_map.get(t, t) for t in other.track_ids)
+        else:
+            self.track_ids.extend(other.track_ids)
+        self.class_ids.extend(class_map[c] for c in other.class_ids)
+        self.confidences.extend(other.confidences)
+        self.boxes.extend(other.boxes)
+
+    def save(self, path, fps, events=()):
+        """
+        Write the columns sorted by frame. events are the video's track events;
+        their final plate reads are stored per track, since a box's own plate
+        was only the best read so far when it was seen.
+        """
+        order = np.argsort(np.frombuffer(self.frames, dtype=np.int32), kind="stable")
+        columns = {
+            "frame": np.frombuffer(self.frames, dtype=np.int32)[order],
+            "track_id": np.frombuffer(self.track_ids, dtype=np.int32)[order],
+            "class_id": np.frombuffer(self.class_ids, dtype=np.int16)[order],
+            "confidence": np.frombuffer(self.confidences, dtype=np.float32)[order],
+            "bbox": np.frombuffer(self.boxes, dtype=np.int32).reshape(-1, 4)[order],
+            "classes": np.array(self.classes, dtype=str),
+            "fps": np.array(fps or 0.0, dtype=np.float64),
+            "plate_track_id": np.array([e["track_id"] for e in events], dtype=np.int32),
+            "plate": np.array([e.get("license_plate") or "N/A" for e in events], dtype=str).reshape(-1),
+            "plate_confidence": np.array([e.get("ocr_confidence") or 0.0 for e in events], dtype=np.float32),
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, path)
+
+
+def _load(path):
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            _cache.move_to_end(path)
+            return cached[1]
+    with np.load(path, allow_pickle=False) as data:
+        columns = {name: data[name] for name in data.files}
+    columns["plates"] = {
+        int(track_id): (str(plate), round(float(conf), 2))
+        for track_id, plate, conf in zip(columns["plate_track_id"], columns["plate"], columns["plate_confidence"])
+    }
+    with _cache_lock:
+        _cache[path] = (mtime, columns)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return columns
+
+
+def query(record_id, start_frame=None, end_frame=None, offset=0, limit=None):
+    """
+    Detections of a video in the frame range [start_frame, end_frame], in frame order.
+    Returns:
+        (total in range, list of detection dicts for the page), or None if the
+        video has no sidecar
+    """
+    path = sidecar_path(record_id)
+    if not os.path.exists(path):
+        return None
+    columns = _load(path)
+    frames = columns["frame"]
+    lo = 0 if start_frame is None else int(np.searchsorted(frames, start_frame, side="left"))
+    hi = len(frames) if end_frame is None else int(np.searchsorted(frames, end_frame, side="right"))
+    total = max(0, hi - lo)
+    page_lo = min(hi, lo + offset)
+    page_hi = hi if limit is None else min(hi, page_lo + limit)
+
+    classes = columns["classes"]
+    fps = float(columns["fps"])
+    plates = columns["plates"]
+    rows = []
+    for i in range(page_lo, page_hi):
+        frame = int(frames[i])
+        track_id = int(columns["track_id"][i])
+        plate, ocr_confidence = plates.get(track_id, ("N/A", 0.0))
+        rows.append({
+            "frame": frame,
+            "timestamp": round(frame / fps, 3) if fps else None,
+            "track_id": track_id,
+            "violation_type": str(classes[columns["class_id"][i]]),
+            "confidence": round(float(columns["confidence"][i]), 2),
+            "bbox": columns["bbox"][i].tolist(),
+            "license_plate": plate,
+            "ocr_confidence": ocr_confidence,
+        })
+    return total, rows
+
+
+def remove(record_ids):
+    """
+    Delete the sidecars of the given records. Returns the number removed.
+    """
+    removed = 0
+    for record_id in record_ids:
+        path = sidecar_path(record_id)
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove {path}: {e}")
+        with _cache_lock:
+            _cache.pop(path, None)
+    return removed
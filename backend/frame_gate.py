@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+
+
+class FrameGate:
+    """
+    Decides which decoded frames are worth running inference on.
+
+    Each frame is scored cheaply against the last inferred frame on a
+    downscaled grayscale copy. Motion is the share of changed pixels (those
+    differing by more than pixel_threshold) in the busiest cell of a grid x grid
+    split of the frame, so a vehicle in one part of a wide shot counts as much
+    as it would filling the frame; a whole-frame mean would wash it out. Scene
+    change is the delta of the intensity histogram. Inference runs when
+      - the frame differs enough (motion_threshold) and min_interval frames
+        have passed since the last inference, or
+      - the scene changed (scene_change_threshold), regardless of min_interval, or
+      - max_interval frames have passed, so static footage is still sampled.
+    """
+
+    def __init__(self, min_interval=2, max_interval=15, motion_threshold=0.02,
+                 scene_change_threshold=0.4, pixel_threshold=15, grid=4, downscale_width=128):
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.motion_threshold = motion_threshold
+        self.scene_change_threshold = scene_change_threshold
+        self.pixel_threshold = pixel_threshold
+        self.grid = max(1, grid)
+        self.downscale_width = downscale_width
+        self._reference = None
+        self._reference_hist = None
+        self._last_index = None
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+
+    def _signature(self, frame):
+        h, w = frame.shape[:2]
+        small_h = max(1, int(h * self.downscale_width / float(w)))
+        small = cv2.resize(frame, (self.downscale_width, small_h), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+        cv2.normalize(hist, hist, alpha=1.0, norm_type=cv2.NORM_L1)
+        return gray, hist
+
+    def _motion(self, gray):
+        changed = cv2.absdiff(gray, self._reference) > self.pixel_threshold
+        h, w = changed.shape
+        rows = np.array_split(np.arange(h), min(self.grid, h))
+        cols = np.array_split(np.arange(w), min(self.grid, w))
+        return max(
+            float(changed[r[0]:r[-1] + 1, c[0]:c[-1] + 1].mean())
+            for r in rows for c in cols
+        )
+
+    def __call__(self, frame, index):
+        """
+        Returns True if inference should run on this frame.
+        """
+        gray, hist = self._signature(frame)
+
+        if self._last_index is None:
+            infer = True
+        else:
+            since_last = index - self._last_index
+            motion = self._motion(gray)
+            # L1 distance between normalized histograms, in [0, 2] -> [0, 1]
+            scene_change = float(np.abs(hist - self._reference_hist).sum()) / 2.0
+
+            if scene_change >= self.scene_change_threshold:
+                infer = True
+            elif since_last < self.min_interval:
+                infer = False
+            elif since_last >= self.max_interval:
+                infer = True
+            else:
+                infer = motion >= self.motion_threshold
+
+        if infer:
+            self._reference = gray
+            self._reference_hist = hist
+            self._last_index = index
+            self.frames_inferred += 1
+        else:
+            self.frames_skipped += 1
+        return infer
@@ -1,38 +1,331 @@
 import json
 import os
+import sqlite3
+import threading
 from datetime import datetime
 
+import config
+
+# Detection history lives in SQLite (WAL mode, so readers never block the
+# inference workers writing new records). Records and their detections are
+# stored in separate, indexed tables.
+HISTORY_DB = config.HISTORY_DB
+
+# Legacy flat-file history, imported once into the database on first start
 HISTORY_FILE = "history.json"
 
-def load_history():
-    if not os.path.exists(HISTORY_FILE):
-        return []
+# SQLite limits bound parameters per statement; stay well below it
+_MAX_SQL_PARAMS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    detection_count INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records(timestamp);
+
+CREATE TABLE IF NOT EXISTS detections (
+    record_id TEXT NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    violation_type TEXT COLLATE NOCASE,
+    license_plate TEXT COLLATE NOCASE,
+    confidence REAL,
+    frame INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (record_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_detections_type ON detections(violation_type, record_id);
+CREATE INDEX IF NOT EXISTS idx_detections_plate ON detections(license_plate);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    """
+    Per-thread connection; the schema (and legacy migration) is set up on first use.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(HISTORY_DB, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+        _ensure_initialized(conn)
+    return conn
+
+
+def connection():
+    """
+    This thread's connection to the history database, for modules that keep
+    their own tables next to the history (e.g. result_cache).
+    """
+    return _connect()
+
+
+def _ensure_initialized(conn):
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        _initialized = True
+    migrate_json_history()
+
+
+def _chunks(items, size=_MAX_SQL_PARAMS):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _record_rows(record):
+    """
+    Split a record into its records-row values and detections-row values.
+    """
+    detections = record.get("detections") or []
+    summary = {k: v for k, v in record.items() if k != "detections"}
+    media_type = "video" if "annotated_video_url" in record else "image"
+    record_row = (
+        record["id"],
+        record.get("timestamp") or datetime.now().isoformat(),
+        media_type,
+        len(detections),
+        json.dumps(summary),
+    )
+    detection_rows = [
+        (
+            record["id"],
+            position,
+            d.get("violation_type"),
+            d.get("license_plate"),
+            d.get("confidence"),
+            d.get("frame"),
+            json.dumps(d),
+        )
+        for position, d in enumerate(detections)
+    ]
+    return record_row, detection_rows
+
+
+def _insert(conn, records, replace=False):
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    for record in records:
+        record_row, detection_rows = _record_rows(record)
+        cur = conn.execute(
+            f"{verb} INTO records (id, timestamp, media_type, detection_count, data) VALUES (?, ?, ?, ?, ?)",
+            record_row,
+        )
+        if cur.rowcount == 0:
+            continue  # Already present
+        conn.execute("DELETE FROM detections WHERE record_id = ?", (record["id"],))
+        conn.executemany(
+            "INSERT INTO detections (record_id, position, violation_type, license_plate, confidence, frame, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            detection_rows,
+        )
+
+
+def _hydrate(conn, rows):
+    """
+    Rebuild full record dicts (with detections) from records rows, preserving order.
+    """
+    records = []
+    by_id = {}
+    for row in rows:
+        record = json.loads(row["data"])
+        record["detections"] = []
+        records.append(record)
+        by_id[row["id"]] = record
+
+    for ids in _chunks(by_id):
+        placeholders = ",".join("?" * len(ids))
+        for det in conn.execute(
+            f"SELECT record_id, data FROM detections WHERE record_id IN ({placeholders}) "
+            f"ORDER BY record_id, position",
+            ids,
+        ):
+            by_id[det["record_id"]]["detections"].append(json.loads(det["data"]))
+    return records
+
+
+def _summarize(conn, rows):
+    """
+    Records without their detections, for cheap listings: detection_count and
+    violation_counts ({type: count}) stand in for the detection list.
+    """
+    records = []
+    by_id = {}
+    for row in rows:
+        record = json.loads(row["data"])
+        record["detection_count"] = row["detection_count"]
+        record["violation_counts"] = {}
+        records.append(record)
+        by_id[row["id"]] = record
+
+    for ids in _chunks(by_id):
+        placeholders = ",".join("?" * len(ids))
+        for det in conn.execute(
+            f"SELECT record_id, violation_type, COUNT(*) AS n FROM detections WHERE record_id IN ({placeholders}) "
+            f"GROUP BY record_id, violation_type",
+            ids,
+        ):
+            by_id[det["record_id"]]["violation_counts"][det["violation_type"]] = det["n"]
+    return records
+
+
+def migrate_json_history(path=None):
+    """
+    One-shot import of the legacy history.json into the database. The file is
+    renamed to *.migrated afterwards so the import never runs twice.
+    Returns the number of records imported.
+    """
+    path = path or HISTORY_FILE
+    if not os.path.exists(path):
+        return 0
     try:
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return []
+        with open(path, "r") as f:
+            history = json.load(f)
+    except Exception as e:
+        print(f"Could not read legacy history {path}: {e}")
+        return 0
+
+    conn = _connect()
+    records = [r for r in history if r.get("id")]
+    with conn:
+        _insert(conn, records)
+    os.replace(path, path + ".migrated")
+    print(f"Migrated {len(records)} records from {path} to {HISTORY_DB}")
+    return len(records)
 
-def save_history(history):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=4)
 
 def add_record(record):
-    history = load_history()
-    # Add ID if not present (though we should generate it before calling this)
-    history.insert(0, record) # Prepend to show newest first
-    save_history(history)
+    add_records([record])
+
+
+def add_records(records):
+    """
+    Insert many records in a single transaction.
+    """
+    conn = _connect()
+    with conn:
+        _insert(conn, records, replace=True)
+
+
+def artifact_paths(record):
+    """
+    Files in RESULTS_DIR that belong to a record (annotated media + evidence frames).
+    """
+    urls = [record.get("annotated_image_url"), record.get("annotated_video_url")]
+    urls += [d.get("frame_image_url") for d in record.get("detections", [])]
+    names = {url.split("/")[-1] for url in urls if url}
+    return sorted(os.path.join(config.RESULTS_DIR, name) for name in names)
+
 
 def delete_records(ids):
-    history = load_history()
-    # Filter out records with IDs in the deletion list
-    new_history = [r for r in history if r.get("id") not in ids]
-    save_history(new_history)
-    return len(history) - len(new_history)
+    conn = _connect()
+    count = 0
+    with conn:
+        for chunk in _chunks(ids):
+            placeholders = ",".join("?" * len(chunk))
+            # Detections go with their record (ON DELETE CASCADE)
+            count += conn.execute(f"DELETE FROM records WHERE id IN ({placeholders})", chunk).rowcount
+    return count
+
+
+def get_record(record_id):
+    conn = _connect()
+    rows = conn.execute("SELECT id, data FROM records WHERE id = ?", (record_id,)).fetchall()
+    records = _hydrate(conn, rows)
+    return records[0] if records else None
+
 
 def get_all_records():
-    return load_history()
+    return query_records()[1]
+
 
 def get_records_by_ids(ids):
-    history = load_history()
-    return [r for r in history if r.get("id") in ids]
+    conn = _connect()
+    rows = []
+    for chunk in _chunks(ids):
+        placeholders = ",".join("?" * len(chunk))
+        rows.extend(conn.execute(
+            f"SELECT id, data FROM records WHERE id IN ({placeholders}) ORDER BY timestamp DESC", chunk
+        ).fetchall())
+    return _hydrate(conn, rows)
+
+
+def get_detections(record_id, start_frame=None, end_frame=None, offset=0, limit=None):
+    """
+    A record's stored detections, optionally only those in a frame range.
+    Returns:
+        (total matching detections, list of detections for the page)
+    """
+    where = "record_id = ?"
+    params = [record_id]
+    if start_frame is not None:
+        where += " AND frame >= ?"
+        params.append(start_frame)
+    if end_frame is not None:
+        where += " AND frame <= ?"
+        params.append(end_frame)
+
+    conn = _connect()
+    total = conn.execute(f"SELECT COUNT(*) FROM detections WHERE {where}", params).fetchone()[0]
+    page_sql = f"SELECT data FROM detections WHERE {where} ORDER BY position"
+    if limit is not None:
+        page_sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    return total, [json.loads(row["data"]) for row in conn.execute(page_sql, params)]
+
+
+def query_records(limit=None, offset=0, start=None, end=None, violation_type=None, plate=None,
+                  include_detections=True):
+    """
+    Filtered, paginated history, newest first.
+    Args:
+        limit / offset: Page window (limit=None returns everything)
+        start / end: ISO date or datetime bounds on the record timestamp (inclusive)
+        violation_type: Only records with a detection of this type (case-insensitive)
+        plate: Only records with a plate starting with this text (case-insensitive)
+        include_detections: False returns summaries (see _summarize) instead of full records
+    Returns:
+        (total matching records, list of records for the page)
+    """
+    where = []
+    params = []
+    if start:
+        where.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        # A bare date means the whole day
+        where.append("timestamp <= ?")
+        params.append(end if "T" in end else f"{end}T23:59:59.999999")
+    if violation_type:
+        where.append("EXISTS (SELECT 1 FROM detections d WHERE d.record_id = records.id "
+                     "AND d.violation_type = ?)")
+        params.append(violation_type)
+    if plate:
+        where.append("EXISTS (SELECT 1 FROM detections d WHERE d.record_id = records.id "
+                     "AND d.license_plate LIKE ?)")
+        params.append(plate.replace("%", "").replace("_", "") + "%")
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    conn = _connect()
+    total = conn.execute(f"SELECT COUNT(*) FROM records {where_sql}", params).fetchone()[0]
+
+    page_sql = f"SELECT id, data, detection_count FROM records {where_sql} ORDER BY timestamp DESC"
+    page_params = list(params)
+    if limit is not None:
+        page_sql += " LIMIT ? OFFSET ?"
+        page_params += [limit, offset]
+    rows = conn.execute(page_sql, page_params).fetchall()
+    return total, (_hydrate if include_detections else _summarize)(conn, rows)
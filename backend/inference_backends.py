@@ -0,0 +1,245 @@
+import ast
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Detector backends behind model_registry.
+#
+# Every backend takes a list of BGR images and returns, per image, an (N, 6)
+# float32 array of [x1, y1, x2, y2, confidence (0-1), class id] in that
+# image's pixel coordinates, so detection records come out the same whichever
+# backend produced them. The frameworks are imported when a backend loads.
+
+BACKENDS = ("ultralytics", "onnx")
+
+
+def _set_torch_threads(intra_op_threads, inter_op_threads):
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Can only be set before torch has started any parallel work
+            print("Inter-op thread count already fixed for this process, ignoring")
+
+
+class UltralyticsBackend:
+    """
+    best.pt in PyTorch eager mode through ultralytics.YOLO.
+    """
+    name = "ultralytics"
+    # The ultralytics predictor keeps per-call state, so calls are serialized
+    thread_safe = False
+
+    def __init__(self, model_path, imgsz=640, conf=0.25, iou=0.7,
+                 intra_op_threads=0, inter_op_threads=0, device=None):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.device = device
+        self._model = None
+
+    def load(self):
+        from ultralytics import YOLO
+
+        _set_torch_threads(self.intra_op_threads, self.inter_op_threads)
+        print(f"Loading model from: {self.model_path}")
+        self._model = YOLO(self.model_path)
+
+    @property
+    def names(self):
+        return self._model.names
+
+    def predict(self, images):
+        kwargs = {"imgsz": self.imgsz, "conf": self.conf, "iou": self.iou, "verbose": False}
+        if self.device is not None:
+            kwargs["device"] = self.device
+        results = self._model(images, **kwargs)
+
+        # ultralytics returns one Results object per input image, in input order
+        outputs = []
+        for result in results:
+            boxes = result.boxes
+            if len(boxes) == 0:
+                outputs.append(np.zeros((0, 6), dtype=np.float32))
+                continue
+            outputs.append(np.concatenate([
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy()[:, None],
+                boxes.cls.cpu().numpy()[:, None],
+            ], axis=1).astype(np.float32))
+        return outputs
+
+
+def letterbox(img, size, color=(114, 114, 114)):
+    """
+    Resize keeping the aspect ratio and pad to a size x size square, the way
+    ultralytics prepares its input.
+    Returns:
+        (padded image, scale, (pad_x, pad_y))
+    """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, scale, (left, top)
+
+
+def _nms(boxes, scores, class_ids, conf, iou):
+    # Per-class NMS, as ultralytics does by default
+    xywh = np.column_stack([boxes[:, 0], boxes[:, 1], boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]])
+    if hasattr(cv2.dnn, "NMSBoxesBatched"):
+        keep = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), class_ids.tolist(), conf, iou)
+    else:
+        # Offsetting each class far apart keeps boxes of different classes from suppressing each other
+        offset = (class_ids * 4096.0)[:, None]
+        shifted = xywh.copy()
+        shifted[:, :2] += offset
+        keep = cv2.dnn.NMSBoxes(shifted.tolist(), scores.tolist(), conf, iou)
+    return np.array(keep, dtype=int).reshape(-1)
+
+
+class OnnxBackend:
+    """
+    best.pt exported to ONNX and run with ONNX Runtime on the CPU.
+
+    The export (and the optional dynamic int8 quantization) runs once and is
+    reused until best.pt changes. Preprocessing (letterbox) and NMS are done
+    here with OpenCV, matching ultralytics' defaults, for YOLOv8-style heads
+    that output (batch, 4 + classes, anchors).
+    """
+    name = "onnx"
+    # InferenceSession.run may be called from several threads at once
+    thread_safe = True
+
+    def __init__(self, model_path, onnx_path=None, imgsz=640, conf=0.25, iou=0.7,
+                 intra_op_threads=0, inter_op_threads=0, quantize=False):
+        self.model_path = model_path
+        self.onnx_path = onnx_path or os.path.splitext(model_path)[0] + ".onnx"
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.quantize = quantize
+        self._session = None
+        self._input_name = None
+        self._names = None
+
+    def _stale(self, path, source):
+        return not os.path.exists(path) or (
+            os.path.exists(source) and os.path.getmtime(path) < os.path.getmtime(source))
+
+    def export(self):
+        """
+        Export best.pt (and quantize it if configured) unless an up-to-date
+        file exists. Returns the path of the model to load.
+        """
+        if self._stale(self.onnx_path, self.model_path):
+            from ultralytics import YOLO
+
+            print(f"Exporting {self.model_path} to ONNX (imgsz {self.imgsz})")
+            t0 = time.perf_counter()
+            exported = YOLO(self.model_path).export(format="onnx", imgsz=self.imgsz, dynamic=True)
+            if os.path.abspath(exported) != os.path.abspath(self.onnx_path):
+                os.replace(exported, self.onnx_path)
+            print(f"ONNX export took {time.perf_counter() - t0:.1f}s")
+
+        if not self.quantize:
+            return self.onnx_path
+
+        quantized_path = os.path.splitext(self.onnx_path)[0] + ".int8.onnx"
+        if self._stale(quantized_path, self.onnx_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"Quantizing {self.onnx_path} to int8")
+            quantize_dynamic(self.onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+        return quantized_path
+
+    def load(self):
+        import onnxruntime as ort
+
+        path = self.export()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            options.inter_op_num_threads = self.inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        print(f"Loading ONNX model from: {path}")
+        self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+        # ultralytics stores the class names in the model metadata
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self._names = {int(k): v for k, v in ast.literal_eval(metadata.get("names", "{}")).items()}
+
+    @property
+    def names(self):
+        return self._names
+
+    def predict(self, images):
+        batch = []
+        transforms = []
+        for img in images:
+            padded, scale, pad = letterbox(img, self.imgsz)
+            batch.append(padded)
+            transforms.append((scale, pad, img.shape[:2]))
+        # BGR HWC uint8 -> RGB NCHW float in [0, 1]
+        blob = np.ascontiguousarray(np.stack(batch)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        output = self._session.run(None, {self._input_name: blob})[0]
+        return [self._postprocess(pred, *transform) for pred, transform in zip(output, transforms)]
+
+    def _postprocess(self, pred, scale, pad, shape):
+        pred = pred.T  # (anchors, 4 + classes)
+        scores_all = pred[:, 4:]
+        class_ids = scores_all.argmax(axis=1)
+        scores = scores_all[np.arange(len(pred)), class_ids]
+        mask = scores >= self.conf
+        if not mask.any():
+            return np.zeros((0, 6), dtype=np.float32)
+        pred, scores, class_ids = pred[mask], scores[mask], class_ids[mask]
+
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.column_stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+        keep = _nms(boxes, scores, class_ids, self.conf, self.iou)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo the letterbox
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / scale
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+        order = np.argsort(-scores)
+        return np.column_stack([boxes, scores, class_ids]).astype(np.float32)[order]
+
+
+def create_backend(name, model_path, imgsz=640, conf=0.25, iou=0.7, intra_op_threads=0,
+                   inter_op_threads=0, onnx_path=None, quantize=False):
+    """
+    Build (but don't load) the backend called name. ONNX-only options are
+    ignored by the ultralytics backend.
+    """
+    if name == "ultralytics":
+        return UltralyticsBackend(model_path, imgsz=imgsz, conf=conf, iou=iou,
+                                  intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+    if name == "onnx":
+        return OnnxBackend(model_path, onnx_path=onnx_path, imgsz=imgsz, conf=conf, iou=iou,
+                           intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads,
+                           quantize=quantize)
+    raise ValueError(f"Unknown inference backend {name!r} (expected one of {', '.join(BACKENDS)})")
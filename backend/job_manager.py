@@ -0,0 +1,206 @@
+import queue
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import metrics
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once cancellation has been requested."""
+
+
+class Job:
+    """
+    A unit of background work plus the state exposed through GET /jobs/{id}.
+    """
+
+    def __init__(self, func, args, kwargs, kind="upload", job_id=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_done = 0
+        self.frames_total = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        """
+        Called by job functions between units of work so cancellation is prompt.
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def update_progress(self, frames_done, frames_total=None):
+        self.frames_done = frames_done
+        if frames_total is not None:
+            self.frames_total = frames_total
+
+    def to_dict(self):
+        progress = None
+        if self.frames_total:
+            progress = round(min(self.frames_done / self.frames_total, 1.0) * 100, 2)
+
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "frames_done": self.frames_done,
+                "frames_total": self.frames_total,
+                "percent": progress,
+            },
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Bounded job queue drained by a fixed pool of worker threads.
+
+    Job functions are called as func(job, *args, **kwargs) and their return
+    value becomes the job result. The blocking OpenCV/YOLO/EasyOCR work runs in
+    these threads so the API event loop stays responsive.
+    """
+
+    def __init__(self, num_workers, max_queued, max_finished, name="inference"):
+        self.name = name
+        self.num_workers = max(1, num_workers)
+        self.max_finished = max(1, max_finished)
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._jobs = OrderedDict()
+        self._finished_ids = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._workers:
+            return
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f"Started {self.num_workers} {self.name} workers (queue limit {self._queue.maxsize})")
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def submit(self, func, *args, kind="upload", job_id=None, **kwargs):
+        job = Job(func, args, kwargs, kind=kind, job_id=job_id)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Job queue is full ({self._queue.maxsize} pending)")
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Request cancellation. Queued jobs are cancelled immediately, running jobs
+        stop at their next check_cancelled() call.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def running_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+    def _finish(self, job, status, result=None, error=None):
+        # Caller must hold self._lock
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+        metrics.JOBS.inc(kind=job.kind, status=status)
+        # Drop references to the inputs (frames, upload buffers) once done
+        job.args = ()
+        job.kwargs = {}
+        self._finished_ids[job.id] = True
+        while len(self._finished_ids) > self.max_finished:
+            old_id, _ = self._finished_ids.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                with self._lock:
+                    if job.status != QUEUED:
+                        continue  # Cancelled while waiting
+                    job.status = RUNNING
+                    job.started_at = datetime.now().isoformat()
+
+                try:
+                    result = job.func(job, *job.args, **job.kwargs)
+                except JobCancelled:
+                    with self._lock:
+                        self._finish(job, CANCELLED)
+                except Exception as e:
+                    traceback.print_exc()
+                    with self._lock:
+                        self._finish(job, FAILED, error=str(e))
+                else:
+                    with self._lock:
+                        self._finish(job, COMPLETED, result=result)
+            finally:
+                self._queue.task_done()
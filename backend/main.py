@@ -1,13 +1,30 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
-import shutil
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Optional
 import os
 import uuid
-from datetime import datetime
-from detection import run_inference
+import batch_ingest
+import config
+import detection_store
 import history_manager
+import media_processor
+import metrics
+import report_generator
+import result_cache
+import sources
+import video_segments
+from stream_sessions import SessionLimitError, StreamManager
+from job_manager import FINISHED_STATES, JobManager, QueueFullError
+from model_registry import registry
 
 app = FastAPI(title="EcoScout API", description="Smart Vehicle Littering & Smoke Emission Detection System")
 
@@ -18,177 +35,421 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count"],
 )
 
 # Directory Setup
-UPLOAD_DIR = "uploads"
-RESULTS_DIR = "results"
+UPLOAD_DIR = config.UPLOAD_DIR
+RESULTS_DIR = config.RESULTS_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
+os.makedirs(config.REPORTS_DIR, exist_ok=True)
 
 # Mount static files for serving annotated images
 app.mount("/results", StaticFiles(directory=RESULTS_DIR), name="results")
 
+# Background inference workers
+job_manager = JobManager(config.INFERENCE_WORKERS, config.MAX_QUEUED_JOBS, config.MAX_FINISHED_JOBS)
+metrics.QUEUE_DEPTH.set_function(job_manager.queue_depth)
+metrics.RUNNING_JOBS.set_function(job_manager.running_count)
+
+# Report exports get their own workers so a long export never holds up uploads
+export_manager = JobManager(config.EXPORT_WORKERS, config.MAX_QUEUED_EXPORTS, config.MAX_FINISHED_JOBS, name="export")
+
+# Live camera stream sessions
+stream_manager = StreamManager(config.STREAM_MAX_SESSIONS, config.STREAM_MAX_FINISHED_SESSIONS)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized uploads from the Content-Length header, before the body is read
+    if request.method == "POST" and request.url.path.startswith("/upload"):
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > config.MAX_UPLOAD_BYTES:
+            return JSONResponse(status_code=413, content={
+                "detail": f"Upload exceeds the {config.MAX_UPLOAD_BYTES} byte limit"
+            })
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/jobs/{job_id}) rather than raw path to keep cardinality low
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    metrics.REQUESTS.inc(method=request.method, path=path, status=response.status_code)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, method=request.method, path=path)
+    return response
+
+@app.on_event("startup")
+def start_workers():
+    job_manager.start()
+    export_manager.start()
+
+@app.on_event("startup")
+def preload_models():
+    # Load in the background so /health/live answers while the models warm up
+    if config.PRELOAD_MODELS:
+        threading.Thread(target=_load_models, name="model-loader", daemon=True).start()
+
+def _load_models():
+    try:
+        registry.load()
+    except Exception:
+        import traceback
+        traceback.print_exc()
+
+@app.on_event("shutdown")
+def stop_workers():
+    job_manager.stop()
+    export_manager.stop()
+    stream_manager.stop_all()
+    video_segments.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "EcoScout API is running"}
 
-@app.post("/upload")
-async def upload_media(file: UploadFile = File(...)):
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    status = registry.status()
+    if status["ready"]:
+        return dict(status, status="ready")
+    if status["error"]:
+        return JSONResponse(status_code=503, content=dict(status, status="failed"))
+    if not config.PRELOAD_MODELS:
+        # Lazy mode: models load on the first request by design
+        return dict(status, status="lazy")
+    return JSONResponse(status_code=503, content=dict(status, status="loading"))
+
+@app.post("/upload", status_code=202)
+async def upload_media(file: UploadFile = File(...), timings: bool = False, source_id: Optional[str] = None):
+    # Generate unique filename
+    file_ext = file.filename.split(".")[-1].lower()
+    if file_ext in config.IMAGE_EXTENSIONS:
+        process = media_processor.process_image
+    elif file_ext in config.VIDEO_EXTENSIONS:
+        process = media_processor.process_video
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    roi = await run_in_threadpool(_source_roi, source_id)
+
+    content_hash, image_bytes, part_path = await _receive_upload(file, file_ext)
+
+    # Identical content processed before: return the stored result
+    key, cached = await run_in_threadpool(_lookup_cached_upload, content_hash, source_id, roi)
+    if cached:
+        if part_path:
+            os.remove(part_path)
+        return JSONResponse(status_code=200, content={
+            "job_id": cached["id"],
+            "status": "completed",
+            "cached": True,
+            "result": cached
+        })
+
+    file_id = str(uuid.uuid4())
+    filename = f"{file_id}.{file_ext}"
+    if part_path:
+        # Videos are processed from disk
+        source = os.path.join(UPLOAD_DIR, filename)
+        os.replace(part_path, source)
+    else:
+        # Images are decoded straight from memory by the worker
+        source = image_bytes
+
+    # Hand the heavy lifting to the worker pool and return immediately
     try:
-        # Generate unique filename
-        file_ext = file.filename.split(".")[-1]
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}.{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Determine output path
-        output_filename = f"annotated_{filename}"
-        output_path = os.path.join(RESULTS_DIR, output_filename)
-        
-        if file_ext.lower() in ['jpg', 'jpeg', 'png', 'bmp']:
-            detections = run_inference(file_path, output_path)
-            
-            result = {
-                "id": file_id,
-                "status": "success",
-                "timestamp": datetime.now().isoformat(),
-                "original_file": filename,
-                "annotated_image_url": f"http://localhost:8000/results/{output_filename}",
-                "detections": detections
-            }
-            
-            # Save to history
-            history_manager.add_record(result)
-            
-            return JSONResponse(content=result)
-            
-        elif file_ext.lower() in ['mp4', 'avi', 'mov']:
-            import cv2
-            cap = cv2.VideoCapture(file_path)
-            if not cap.isOpened():
-                 raise HTTPException(status_code=400, detail="Could not open video file")
-            
-            # Video properties
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            # Output video writer
-            output_video_filename = f"annotated_{filename}"
-            output_video_path = os.path.join(RESULTS_DIR, output_video_filename)
-            # Use 'avc1' for H.264 which is web-friendly. Fallback to 'mp4v' if needed.
-            # Note: OpenCV requires openh264-1.8.0-win64.dll or similar for avc1 on Windows sometimes.
-            # If 'avc1' fails, it might fall back or error. 'mp4v' is safer but less compatible with some browsers.
-            # Let's try 'mp4v' but ensure the container is .mp4. 
-            # Actually, standard browsers support H.264 (avc1). 
-            try:
-                fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            except:
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                
-            out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
-            
-            all_detections = []
-            frame_count = 0
-            process_every_n_frames = 5 # Optimization
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Check if we should process this frame
-                if frame_count % process_every_n_frames == 0:
-                    detections = run_inference(frame, output_path=None)
-                    
-                    # If this frame has relevant detections, save it
-                    if detections:
-                        frame_img_name = f"frame_{file_id}_{frame_count}.jpg"
-                        frame_img_path = os.path.join(RESULTS_DIR, frame_img_name)
-                        # Save the frame *with annotations*? Or raw?
-                        # Usually user wants to see the evidence. 
-                        # run_inference returns pure records without modifying the frame in-place (mostly).
-                        # Let's verify run_inference side effects.
-                        # It draws on 'img' which is a copy in the function, but doesn't return it.
-                        # So 'frame' here is clean.
-                        # We should draw on a copy for the saved image.
-                        
-                        evidence_frame = frame.copy()
-                        for d in detections:
-                            bbox = d['bbox']
-                            label = d['violation_type']
-                            conf = d['confidence']
-                            color = (0, 255, 0)
-                            if label.lower() in ['littering', 'smoke']:
-                                color = (0, 0, 255)
-                            cv2.rectangle(evidence_frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
-                            cv2.putText(evidence_frame, f"{label} {conf}", (bbox[0], bbox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                            if d.get('license_plate') != "N/A":
-                                 cv2.putText(evidence_frame, f"Plate: {d['license_plate']}", (bbox[0], bbox[3]+20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-                                 
-                        cv2.imwrite(frame_img_path, evidence_frame)
-                        
-                        # Add frame info to detections
-                        for d in detections:
-                            d['frame'] = frame_count
-                            d['timestamp'] = frame_count / fps
-                            d['frame_image_url'] = f"http://localhost:8000/results/{frame_img_name}"
-                            all_detections.append(d)
-                        
-                    # Also draw on the video frame (which is used for the video file)
-                    for d in detections:
-                        bbox = d['bbox']
-                        label = d['violation_type']
-                        conf = d['confidence']
-                        color = (0, 255, 0)
-                        if label.lower() in ['littering', 'smoke']:
-                            color = (0, 0, 255)
-                        cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
-                        cv2.putText(frame, f"{label} {conf}", (bbox[0], bbox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                        if d.get('license_plate') != "N/A":
-                             cv2.putText(frame, f"Plate: {d['license_plate']}", (bbox[0], bbox[3]+20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-
-                out.write(frame)
-                frame_count += 1
-                
-            cap.release()
-            out.release()
-            
-            result = {
-                "id": file_id,
-                "status": "success",
-                "message": "Video processed successfully",
-                "timestamp": datetime.now().isoformat(),
-                "original_file": filename,
-                "annotated_video_url": f"http://localhost:8000/results/{output_video_filename}",
-                "detections": all_detections,
-                "frame_count": frame_count
-            }
-            
-            # Save to history
-            history_manager.add_record(result)
-            
-            return JSONResponse(content=result)
-
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
+        job = job_manager.submit(
+            media_processor.process_upload, process, file_id, filename, source,
+            timings=timings, cache_key=key, source_id=source_id, roi=roi, kind="upload", job_id=file_id
+        )
+    except QueueFullError as e:
+        if part_path:
+            os.remove(source)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "queue_depth": job_manager.queue_depth()
+    }
+
+async def _receive_upload(file, file_ext):
+    """
+    Read the upload in chunks, hashing as it streams in. Images stay in memory;
+    videos are written chunk by chunk to a .part file in UPLOAD_DIR.
+    Uploads over the size limit are rejected as soon as the limit is crossed.
+    Returns:
+        (sha256 hex digest, image bytes or None, part file path or None)
+    """
+    is_image = file_ext in config.IMAGE_EXTENSIONS
+    limit = config.MAX_IMAGE_BYTES if is_image else config.MAX_UPLOAD_BYTES
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    part_path = None if is_image else os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.part")
+    out = open(part_path, "wb") if part_path else None
+
+    t0 = time.perf_counter()
+    try:
+        while True:
+            chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"File exceeds the {limit} byte upload limit")
+            digest.update(chunk)
+            if out:
+                await run_in_threadpool(out.write, chunk)
+            else:
+                chunks.append(chunk)
+    except BaseException:
+        if out:
+            out.close()
+            os.remove(part_path)
+        raise
+    if out:
+        out.close()
+    metrics.record_stage("upload_receive", time.perf_counter() - t0)
+
+    return digest.hexdigest(), (b"".join(chunks) if is_image else None), part_path
+
+def _source_roi(source_id):
+    # Region of interest of the camera source an upload belongs to
+    if not source_id:
+        return None
+    try:
+        return sources.get_roi(source_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Source not found")
+
+def _lookup_cached_upload(content_hash, source_id=None, roi=None):
+    if not config.CACHE_ENABLED:
+        return None, None
+    key = result_cache.cache_key(content_hash, source_id, roi.key if roi else None)
+    cached = result_cache.lookup(key)
+    metrics.CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+    return key, cached
+
+@app.post("/upload/batch")
+def upload_batch(files: list[UploadFile] = File(...), source_id: Optional[str] = None):
+    """
+    Process many images (or zip archives of images) in one request. One JSON
+    line per item is streamed back as soon as its batch is done, followed by
+    a summary line.
+    """
+    roi = _source_roi(source_id)
+    slot = batch_ingest.reserve()
+    if slot is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{config.BATCH_UPLOAD_CONCURRENCY} batch uploads already running",
+            headers={"Retry-After": "10"}
+        )
+
+    def lines():
+        try:
+            for item in batch_ingest.ingest(files, source_id=source_id, roi=roi):
+                yield json.dumps(item) + "\n"
+        finally:
+            slot.release()
+
+    # The background task frees the slot even if the stream never started (client gone)
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(slot.release))
+
+def _find_job(job_id):
+    # Returns (manager, job) from whichever manager runs the job, or (None, None)
+    for manager in (job_manager, export_manager):
+        job = manager.get(job_id)
+        if job:
+            return manager, job
+    return None, None
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    _, job = _find_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    manager, _ = _find_job(job_id)
+    job = manager.cancel(job_id) if manager else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/sources", status_code=201)
+def create_source(
+    name: str = Body(..., embed=True),
+    url: Optional[str] = Body(None, embed=True),
+    roi: Optional[list[list[float]]] = Body(None, embed=True)
+):
+    # roi: polygon points as [x, y] fractions of the frame width / height
+    try:
+        return sources.create_source(name, url=url, roi=roi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/sources")
+def list_sources():
+    return sources.list_sources()
+
+@app.get("/sources/{source_id}")
+def get_source(source_id: str):
+    source = sources.get_source(source_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return source
+
+@app.put("/sources/{source_id}")
+def update_source(source_id: str, changes: dict = Body(...)):
+    # Any of name, url, roi; "roi": null removes the region of interest
+    unknown = sorted(set(changes) - set(sources.EDITABLE_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown source fields: {', '.join(unknown)}")
+    try:
+        source = sources.update_source(source_id, **changes)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not source:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return source
+
+@app.delete("/sources/{source_id}")
+def delete_source(source_id: str):
+    if not sources.delete_source(source_id):
+        raise HTTPException(status_code=404, detail="Source not found")
+    return {"message": "Source deleted"}
+
+@app.post("/streams", status_code=201)
+def start_stream(
+    source: Optional[str] = Body(None, embed=True),
+    source_id: Optional[str] = Body(None, embed=True),
+    loop: bool = Body(False, embed=True),
+    name: Optional[str] = Body(None, embed=True)
+):
+    # source: RTSP/HTTP URL, camera index, or a local file (loop=True to replay it).
+    # source_id: a configured camera source; supplies its URL and region of interest.
+    roi = None
+    if source_id:
+        registered = sources.get_source(source_id)
+        if not registered:
+            raise HTTPException(status_code=404, detail="Source not found")
+        source = source or registered["url"]
+        name = name or registered["name"]
+        roi = _source_roi(source_id)
+    if not source:
+        raise HTTPException(status_code=400, detail="A stream source (or a source_id with a URL) is required")
+    try:
+        session = stream_manager.start(source, loop=loop, name=name, source_id=source_id, roi=roi)
+    except SessionLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return session.to_dict()
+
+@app.get("/streams")
+def list_streams():
+    return [session.to_dict() for session in stream_manager.list()]
+
+@app.get("/streams/{session_id}")
+def get_stream(session_id: str):
+    session = stream_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Stream session not found")
+    return session.to_dict()
+
+@app.delete("/streams/{session_id}")
+def stop_stream(session_id: str):
+    session = stream_manager.stop(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Stream session not found")
+    return session.to_dict()
+
+@app.websocket("/ws/streams/{session_id}")
+async def stream_detections(websocket: WebSocket, session_id: str):
+    session = stream_manager.get(session_id)
+    if not session:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    subscriber = session.subscribe(asyncio.get_running_loop())
+    try:
+        await websocket.send_json({"type": "session", "session": session.to_dict()})
+        while session.active or not subscriber.queue.empty():
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            await websocket.send_json(message)
+            if message["type"] == "closed":
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.unsubscribe(subscriber)
 
 @app.get("/history")
-async def get_history():
-    return history_manager.get_all_records()
+def get_history(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    violation_type: Optional[str] = None,
+    plate: Optional[str] = None,
+    include_detections: bool = False
+):
+    # Summaries by default (detection_count / violation_counts); a long video's
+    # detections are fetched separately through /history/{id}/detections
+    total, records = history_manager.query_records(
+        limit=limit, offset=offset, start=start, end=end,
+        violation_type=violation_type, plate=plate, include_detections=include_detections
+    )
+    # Keep the body a plain list for existing clients; paging info goes in headers
+    response.headers["X-Total-Count"] = str(total)
+    return records
+
+@app.get("/history/{id}")
+def get_history_record(id: str):
+    record = history_manager.get_record(id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return record
+
+@app.get("/history/{id}/detections")
+def get_record_detections(
+    id: str,
+    start_frame: Optional[int] = Query(None, ge=0),
+    end_frame: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    # Per-frame boxes of a video (from its sidecar), or the stored detections
+    # of an image, sliced to a frame range and paged
+    page = detection_store.query(id, start_frame, end_frame, offset, limit)
+    if page is None:
+        if not history_manager.get_record(id):
+            raise HTTPException(status_code=404, detail="Record not found")
+        # Images and videos processed before sidecars existed
+        page = history_manager.get_detections(id, start_frame, end_frame, offset, limit)
+    total, detections = page
+    return {"record_id": id, "total": total, "offset": offset, "limit": limit, "detections": detections}
 
 @app.delete("/history")
-async def delete_history(ids: list[str] = Body(...)):
+def delete_history(ids: list[str] = Body(...)):
     # 1. Get the records to be deleted
     records = history_manager.get_records_by_ids(ids)
     
@@ -204,46 +465,73 @@ async def delete_history(ids: list[str] = Body(...)):
                     os.remove(original_path)
                     deleted_files_count += 1
 
-            # Delete annotated image/video
-            annotated_url = record.get("annotated_image_url") or record.get("annotated_video_url")
-            if annotated_url:
-                # Extract filename from URL (http://localhost:8000/results/filename)
-                annotated_filename = annotated_url.split("/")[-1]
-                annotated_path = os.path.join(RESULTS_DIR, annotated_filename)
-                if os.path.exists(annotated_path):
-                    os.remove(annotated_path)
+            # Delete annotated image/video and the evidence frames of its detections
+            for path in history_manager.artifact_paths(record):
+                if os.path.exists(path):
+                    os.remove(path)
                     deleted_files_count += 1
-                    
+
         except Exception as e:
             print(f"Error deleting files for record {record.get('id')}: {e}")
 
-    # 3. Delete from history JSON
+    # 3. Delete from history, along with cached reports
     count = history_manager.delete_records(ids)
+    report_generator.invalidate(ids)
+    deleted_files_count += detection_store.remove(ids)
     return {"message": f"Deleted {count} records and {deleted_files_count} files"}
 
 @app.get("/report/{id}")
-async def get_report(id: str):
+def get_report(id: str):
     # Find record
-    records = history_manager.get_all_records()
-    record = next((r for r in records if r['id'] == id), None)
+    record = history_manager.get_record(id)
     
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
         
-    # Generate PDF
-    report_filename = f"report_{id}.pdf"
-    report_path = os.path.join(RESULTS_DIR, report_filename)
-    
+    # Generate the PDF unless this version of the record already has one
     try:
-        from report_generator import generate_pdf_report
-        generate_pdf_report(record, report_path)
-        
-        return FileResponse(report_path, media_type='application/pdf', filename=report_filename, content_disposition_type='inline')
+        report_path = report_generator.cached_report(record)
+        return FileResponse(report_path, media_type='application/pdf', filename=f"report_{id}.pdf", content_disposition_type='inline')
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
+@app.post("/reports/export", status_code=202)
+def export_reports(
+    ids: Optional[list[str]] = Body(None),
+    start: Optional[str] = Body(None),
+    end: Optional[str] = Body(None),
+    format: str = Body("pdf")
+):
+    # Combined report of the given records, or of every record in a date range
+    if format not in ("pdf", "csv"):
+        raise HTTPException(status_code=400, detail="format must be pdf or csv")
+    try:
+        job = export_manager.submit(
+            report_generator.export_records, ids=ids, start=start, end=end, fmt=format, kind="export"
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "download_url": f"/reports/exports/{job.id}"
+    }
+
+@app.get("/reports/exports/{job_id}")
+def download_export(job_id: str):
+    path = report_generator.export_path(job_id)
+    if path is None:
+        job = export_manager.get(job_id)
+        if job and job.status not in FINISHED_STATES:
+            raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+        raise HTTPException(status_code=404, detail="Export not found")
+    filename = os.path.basename(path)
+    media_type = {"csv": "text/csv", "zip": "application/zip"}.get(filename.rsplit(".", 1)[-1], "application/pdf")
+    return FileResponse(path, media_type=media_type, filename=filename)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
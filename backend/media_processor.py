@@ -0,0 +1,417 @@
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import config
+import detection_store
+import history_manager
+import metrics
+import result_cache
+import video_segments
+from detection import run_inference, run_inference_batch
+from ocr_engine import read_plates, should_ocr
+from frame_gate import FrameGate
+from tracker import IoUTracker, stitch_tracks
+from video_pipeline import VideoPipeline
+
+
+def _results_url(filename):
+    return f"{config.RESULTS_URL}/{filename}"
+
+
+def _remove_quietly(path):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        print(f"Could not remove {path}: {e}")
+
+
+def _prune_evidence(evidence_files, events):
+    """
+    Remove evidence frames no event ended up pointing at: a track's frame is
+    replaced when a later one shows it better (e.g. a better plate read).
+    """
+    kept = {e["frame_image_url"].split("/")[-1] for e in events if e.get("frame_image_url")}
+    for path in evidence_files:
+        if os.path.basename(path) not in kept:
+            _remove_quietly(path)
+
+
+def process_upload(job, process, file_id, filename, source, timings=False, cache_key=None,
+                   source_id=None, roi=None):
+    """
+    Job function: run process_image / process_video, optionally attaching the
+    per-stage time breakdown of this upload as a `timings` block. With a
+    cache_key the result is remembered so identical re-uploads skip processing.
+    source_id / roi tie the upload to a camera source and its region of interest.
+    """
+    collector = metrics.TimingCollector() if timings else None
+    with metrics.collect(collector):
+        result = process(job, file_id, filename, source, source_id=source_id, roi=roi)
+    if cache_key:
+        result_cache.store(cache_key, result)
+    if collector is not None:
+        result = dict(result, timings=collector.to_dict())
+    return result
+
+
+def process_image(job, file_id, filename, source, source_id=None, roi=None):
+    """
+    Job function: run detection on an image and save the history record.
+    source is either the path of a stored image or the raw uploaded bytes,
+    which are decoded in memory (and only written to UPLOAD_DIR when
+    ECOSCOUT_KEEP_ORIGINAL_UPLOADS is set).
+    """
+    output_filename = f"annotated_{filename}"
+    output_path = os.path.join(config.RESULTS_DIR, output_filename)
+
+    job.update_progress(0, 1)
+    image = decode_upload(source, filename) if isinstance(source, bytes) else source
+    detections = run_inference(image, output_path, roi=roi)
+    job.update_progress(1, 1)
+
+    result = image_record(file_id, filename, detections, source_id)
+
+    # Save to history
+    history_manager.add_record(result)
+    return result
+
+
+def decode_upload(data, filename):
+    """
+    Decode uploaded image bytes, keeping the original in UPLOAD_DIR if configured.
+    """
+    with metrics.stage("image_decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image file")
+    if config.KEEP_ORIGINAL_UPLOADS:
+        with metrics.stage("upload_write"), open(os.path.join(config.UPLOAD_DIR, filename), "wb") as f:
+            f.write(data)
+    return image
+
+
+def image_record(file_id, filename, detections, source_id=None):
+    """
+    History record of a processed image; its annotated copy is annotated_<filename>.
+    """
+    record = {
+        "id": file_id,
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "original_file": filename,
+        "annotated_image_url": _results_url(f"annotated_{filename}"),
+        "detections": detections
+    }
+    if source_id:
+        record["source_id"] = source_id
+    return record
+
+
+def process_video(job, file_id, filename, file_path, source_id=None, roi=None):
+    """
+    Job function: run detection on the frames picked by motion-driven sampling, follow
+    objects across frames, write the annotated video plus evidence frames, and
+    save the history record with one event per tracked object (every per-frame
+    box goes to the record's detection_store sidecar).
+    Long videos are split across the segment worker processes when
+    ECOSCOUT_VIDEO_SEGMENT_WORKERS is set.
+    """
+    # Output video
+    output_video_filename = f"annotated_{filename}"
+    output_video_path = os.path.join(config.RESULTS_DIR, output_video_filename)
+
+    if config.VIDEO_SEGMENT_WORKERS > 1:
+        cap = cv2.VideoCapture(file_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        segments = video_segments.plan_segments(
+            total_frames, config.VIDEO_SEGMENT_WORKERS, config.VIDEO_SEGMENT_MIN_FRAMES
+        )
+        if segments:
+            return _process_video_segments(job, file_id, filename, file_path, output_video_path, segments,
+                                           total_frames, source_id, roi)
+
+    pipeline = _video_pipeline(file_path, output_video_path, job.check_cancelled, job.update_progress)
+    fps = pipeline.fps
+    job.update_progress(0, pipeline.total_frames)
+
+    stats, tracker, ocr_stats, evidence_files, frame_detections = _track_video(
+        pipeline, file_id, output_video_path, roi
+    )
+
+    frame_count = stats["frames_written"]
+    job.update_progress(frame_count, frame_count)
+
+    # One consolidated violation event per tracked object
+    all_detections = [track.to_event(fps) for track in tracker.all_tracks()]
+    _prune_evidence(evidence_files, all_detections)
+
+    performance = dict(stats, batch_size=pipeline.batch_size, tracks=len(all_detections),
+                       ocr_calls=ocr_stats["calls"], ocr_skipped=ocr_stats["skipped"])
+    print(f"Video {file_id}: {frame_count} frames in {stats['wall_seconds']}s, "
+          f"{stats['frames_inferred']} inferred / {stats['frames_skipped']} skipped "
+          f"({stats['processing_fps']} fps overall, {stats['inference_fps']} inferred fps at batch size {pipeline.batch_size}, "
+          f"stage busy time {stats['stage_seconds']})")
+
+    return _save_video_result(file_id, filename, output_video_filename, all_detections, frame_count,
+                              performance, source_id, frame_detections, fps)
+
+
+def _video_pipeline(file_path, output_path, check_cancelled, on_progress, start_frame=0, end_frame=None):
+    return VideoPipeline(
+        file_path, output_path,
+        batch_size=config.VIDEO_BATCH_SIZE,
+        gate=FrameGate(
+            min_interval=config.SAMPLE_MIN_INTERVAL_FRAMES,
+            max_interval=config.SAMPLE_MAX_INTERVAL_FRAMES,
+            motion_threshold=config.MOTION_THRESHOLD,
+            pixel_threshold=config.MOTION_PIXEL_THRESHOLD,
+            scene_change_threshold=config.SCENE_CHANGE_THRESHOLD
+        ),
+        # Each of the three stages holds up to queue_size frames (~6 MB each at 1080p)
+        queue_size=config.VIDEO_QUEUE_SIZE or 2 * config.VIDEO_BATCH_SIZE,
+        check_cancelled=check_cancelled,
+        on_progress=on_progress,
+        start_frame=start_frame,
+        end_frame=end_frame
+    )
+
+
+def _track_video(pipeline, file_id, output_video_path, roi=None):
+    """
+    Run the pipeline with batched detection, tracking and per-track plate OCR.
+    Evidence frames are named after the absolute frame index, so segments of
+    the same video never collide. On failure the partial output is removed.
+    Returns:
+        (pipeline stats, tracker, OCR counters, evidence frame paths, FrameDetections)
+    """
+    evidence_files = []
+    frame_detections = detection_store.FrameDetections()
+    tracker = IoUTracker(
+        iou_threshold=config.TRACK_IOU_THRESHOLD,
+        max_centroid_distance=config.TRACK_MAX_CENTROID_DISTANCE,
+        max_age=config.TRACK_MAX_AGE_FRAMES
+    )
+    ocr_stats = {"calls": 0, "skipped": 0}
+    # Evidence frames saved in the current second of video
+    frames_per_second = max(1, round(pipeline.fps or 25))
+    evidence_window = {"second": None, "saved": 0}
+
+    def analyze(packets):
+        # Plates are read per track below, not per box
+        batch_results = run_inference_batch([packet.frame for packet in packets], ocr=False, roi=roi)
+
+        # Assign tracks, and collect every plate-class track due for OCR in this batch
+        ocr_requests = []
+        assigned = []
+        evidence_tracks = {}
+        for packet, detections in zip(packets, batch_results):
+            if not detections:
+                continue
+            packet.detections = detections
+            # Tracks that get this frame as their evidence image
+            evidence_tracks[packet.index] = []
+            for d, track in zip(detections, tracker.update(detections, packet.index)):
+                assigned.append((d, track))
+                if track.evidence_url is None:
+                    evidence_tracks[packet.index].append(track)  # First sighting (or first frame with room for it)
+                if not should_ocr(d['violation_type']):
+                    continue
+                if track.needs_ocr(packet.index, config.OCR_REFRESH_INTERVAL_FRAMES, config.OCR_GOOD_CONFIDENCE):
+                    ocr_requests.append((packet, d, track))
+                    # Reserve the read so later frames of this batch don't queue the same track again
+                    track.last_ocr_frame = packet.index
+                else:
+                    ocr_stats["skipped"] += 1
+
+        # One batched OCR pass over the clean frames
+        plates = read_plates([(packet.frame, d['bbox']) for packet, d, _ in ocr_requests])
+        ocr_stats["calls"] += len(ocr_requests)
+        for (packet, d, track), (plate, ocr_conf) in zip(ocr_requests, plates):
+            if track.record_ocr(packet.index, plate, ocr_conf) and track not in evidence_tracks[packet.index]:
+                evidence_tracks[packet.index].append(track)  # Better plate read than before
+
+        # Every box shows the best plate known for its track
+        for d, track in assigned:
+            d['license_plate'] = track.plate
+            d['ocr_confidence'] = track.ocr_confidence
+
+        for packet in packets:
+            if packet.detections:
+                frame_detections.add(packet.index, packet.detections)
+
+        for packet in packets:
+            tracks = [track for track in evidence_tracks.get(packet.index, ())
+                      if not config.EVIDENCE_MAX_PER_TRACK or track.evidence_count < config.EVIDENCE_MAX_PER_TRACK]
+            if not tracks:
+                continue
+            second = packet.index // frames_per_second
+            if evidence_window["second"] != second:
+                evidence_window.update(second=second, saved=0)
+            if config.EVIDENCE_MAX_PER_SECOND and evidence_window["saved"] >= config.EVIDENCE_MAX_PER_SECOND:
+                continue  # Tracks still without evidence get a later frame
+            evidence_window["saved"] += 1
+            # The encoder hands this annotated frame to the evidence writer
+            frame_img_name = f"frame_{file_id}_{packet.index}.jpg"
+            packet.evidence_path = os.path.join(config.RESULTS_DIR, frame_img_name)
+            evidence_files.append(packet.evidence_path)
+            for track in tracks:
+                track.evidence_url = _results_url(frame_img_name)
+                track.evidence_count += 1
+
+    try:
+        stats = pipeline.run(analyze)
+    except BaseException:
+        # Cancelled or failed: don't leave a half-written video and orphaned frames behind
+        for path in evidence_files + [output_video_path]:
+            _remove_quietly(path)
+        raise
+
+    return stats, tracker, ocr_stats, evidence_files, frame_detections
+
+
+def _process_segment(channel, file_id, file_path, segment_path, start_frame, end_frame, roi=None):
+    """
+    Runs in a segment worker process: track one frame range of the video into
+    its own segment file.
+    """
+    pipeline = _video_pipeline(file_path, segment_path, channel.check_cancelled, channel.update_progress,
+                               start_frame=start_frame, end_frame=end_frame)
+    collector = metrics.TimingCollector()
+    with metrics.collect(collector):
+        stats, tracker, ocr_stats, evidence_files, frame_detections = _track_video(
+            pipeline, file_id, segment_path, roi
+        )
+    return {
+        "tracks": tracker.all_tracks(),
+        "frame_detections": frame_detections,
+        "stats": stats,
+        "ocr": ocr_stats,
+        "evidence_files": evidence_files,
+        "fps": pipeline.fps,
+        "size": (pipeline.width, pipeline.height),
+        "timings": collector.to_dict()
+    }
+
+
+def _process_video_segments(job, file_id, filename, file_path, output_video_path, segments, total_frames,
+                            source_id=None, roi=None):
+    """
+    Process the frame ranges in parallel, then stitch tracks that cross segment
+    boundaries and join the segment videos into the annotated output.
+    total_frames is the container's frame count estimate, used for progress only.
+    """
+    started = time.perf_counter()
+    job.update_progress(0, total_frames)
+    segment_paths = [os.path.join(config.RESULTS_DIR, f"segment_{file_id}_{i}.mp4") for i in range(len(segments))]
+
+    try:
+        results = video_segments.run_segments(
+            _process_segment,
+            [(file_id, file_path, path, start, end, roi) for path, (start, end) in zip(segment_paths, segments)],
+            check_cancelled=job.check_cancelled,
+            on_progress=job.update_progress
+        )
+    except BaseException:
+        # Segments that finished before the failure left their evidence frames behind
+        for name in os.listdir(config.RESULTS_DIR):
+            if name.startswith(f"frame_{file_id}_"):
+                _remove_quietly(os.path.join(config.RESULTS_DIR, name))
+        for path in segment_paths:
+            _remove_quietly(path)
+        raise
+
+    fps = results[0]["fps"]
+    try:
+        video_segments.concat_videos(segment_paths, output_video_path, fps, results[0]["size"])
+    except BaseException:
+        for result in results:
+            for path in result["evidence_files"]:
+                _remove_quietly(path)
+        _remove_quietly(output_video_path)
+        raise
+    finally:
+        for path in segment_paths:
+            _remove_quietly(path)
+
+    # The open-ended last segment ends where its decoder reached the end of the file
+    segments = [(start, start + result["stats"]["frames_decoded"]) for (start, _), result in zip(segments, results)]
+
+    # Segment-local track ids, to renumber the per-frame boxes after stitching
+    local_ids = [[(track.id, track) for track in result["tracks"]] for result in results]
+    tracks = stitch_tracks(
+        [(start, end, result["tracks"]) for (start, end), result in zip(segments, results)],
+        iou_threshold=config.TRACK_IOU_THRESHOLD,
+        max_centroid_distance=config.TRACK_MAX_CENTROID_DISTANCE,
+        max_age=config.TRACK_MAX_AGE_FRAMES
+    )
+    all_detections = [track.to_event(fps) for track in tracks]
+    _prune_evidence([path for result in results for path in result["evidence_files"]], all_detections)
+
+    frame_detections = detection_store.FrameDetections()
+    for result, segment_ids in zip(results, local_ids):
+        frame_detections.extend(result["frame_detections"],
+                                {local_id: track.root().id for local_id, track in segment_ids})
+
+    # Worker-side counters and timings belong to this request
+    collector = metrics.current_collector()
+    if collector is not None:
+        for result in results:
+            collector.merge(result["timings"])
+    stats = {key: sum(result["stats"][key] for result in results)
+             for key in ("frames_decoded", "frames_inferred", "frames_skipped", "frames_written")}
+    metrics.FRAMES.inc(stats["frames_inferred"], kind="inferred")
+    metrics.FRAMES.inc(stats["frames_skipped"], kind="skipped")
+
+    elapsed = time.perf_counter() - started
+    frame_count = stats["frames_written"]
+    job.update_progress(frame_count, frame_count)
+    performance = dict(
+        stats,
+        wall_seconds=round(elapsed, 3),
+        stage_seconds={name: round(sum(result["stats"]["stage_seconds"][name] for result in results), 3)
+                       for name in results[0]["stats"]["stage_seconds"]},
+        processing_fps=round(frame_count / elapsed, 2) if elapsed > 0 else None,
+        segments=[dict(result["stats"], start_frame=start, end_frame=end)
+                  for (start, end), result in zip(segments, results)],
+        segment_workers=config.VIDEO_SEGMENT_WORKERS,
+        batch_size=config.VIDEO_BATCH_SIZE,
+        tracks=len(all_detections),
+        ocr_calls=sum(result["ocr"]["calls"] for result in results),
+        ocr_skipped=sum(result["ocr"]["skipped"] for result in results)
+    )
+    print(f"Video {file_id}: {frame_count} frames in {performance['wall_seconds']}s across "
+          f"{len(segments)} segments ({performance['processing_fps']} fps overall)")
+
+    return _save_video_result(file_id, filename, os.path.basename(output_video_path),
+                              all_detections, frame_count, performance, source_id, frame_detections, fps)
+
+
+def _save_video_result(file_id, filename, output_video_filename, detections, frame_count, performance,
+                       source_id=None, frame_detections=None, fps=None):
+    if frame_detections is not None:
+        with metrics.stage("detections_write"):
+            frame_detections.save(detection_store.sidecar_path(file_id), fps, detections)
+    result = {
+        "id": file_id,
+        "status": "success",
+        "message": "Video processed successfully",
+        "timestamp": datetime.now().isoformat(),
+        "original_file": filename,
+        "annotated_video_url": _results_url(output_video_filename),
+        "detections": detections,
+        "frame_count": frame_count,
+        "frame_detection_count": len(frame_detections) if frame_detections is not None else 0,
+        "performance": performance
+    }
+    if source_id:
+        result["source_id"] = source_id
+
+    # Save to history
+    history_manager.add_record(result)
+    return result
@@ -0,0 +1,225 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus-compatible metrics: counters, gauges and histograms kept
+# in process memory and rendered in the text exposition format on /metrics.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """
+        Read the (unlabelled) value from function() at scrape time.
+        """
+        self._function = function
+
+    def render(self):
+        lines = self._header()
+        if self._function is not None:
+            lines.append(f"{self.name} {self._function()}")
+            return lines
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state["buckets"]):
+                    labels = _format_labels(self.labelnames, key, ("le", repr(float(bound))))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {state['count']}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {state['sum']}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+_registry = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """
+    All metrics in Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Metrics exported by the API
+STAGE_SECONDS = _register(Histogram(
+    "ecoscout_stage_duration_seconds", "Time spent in each processing stage.", ["stage"]))
+REQUESTS = _register(Counter(
+    "ecoscout_http_requests_total", "HTTP requests handled.", ["method", "path", "status"]))
+REQUEST_SECONDS = _register(Histogram(
+    "ecoscout_http_request_duration_seconds", "HTTP request latency.", ["method", "path"]))
+FRAMES = _register(Counter(
+    "ecoscout_frames_processed_total", "Video frames processed, by outcome.", ["kind"]))
+JOBS = _register(Counter(
+    "ecoscout_jobs_total", "Background jobs finished, by kind and final status.", ["kind", "status"]))
+CACHE_LOOKUPS = _register(Counter(
+    "ecoscout_result_cache_lookups_total", "Duplicate-upload cache lookups, by outcome.", ["result"]))
+REPORT_CACHE_LOOKUPS = _register(Counter(
+    "ecoscout_report_cache_lookups_total", "PDF report cache lookups, by outcome.", ["result"]))
+QUEUE_DEPTH = _register(Gauge(
+    "ecoscout_job_queue_depth", "Jobs waiting for an inference worker."))
+RUNNING_JOBS = _register(Gauge(
+    "ecoscout_jobs_running", "Jobs currently being processed."))
+
+
+class TimingCollector:
+    """
+    Per-request stage totals, returned as the optional `timings` block.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            total, count = self._stages.get(stage, (0.0, 0))
+            self._stages[stage] = (total + seconds, count + 1)
+
+    def merge(self, stages):
+        """
+        Add totals reported elsewhere (e.g. by a worker process), in to_dict() form.
+        """
+        with self._lock:
+            for stage, entry in stages.items():
+                total, count = self._stages.get(stage, (0.0, 0))
+                self._stages[stage] = (total + entry["seconds"], count + entry["count"])
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                stage: {"seconds": round(total, 4), "count": count}
+                for stage, (total, count) in sorted(self._stages.items())
+            }
+
+
+_local = threading.local()
+
+
+def current_collector():
+    return getattr(_local, "collector", None)
+
+
+@contextmanager
+def collect(collector):
+    """
+    Route stage timings recorded on this thread into collector (may be None).
+    """
+    previous = current_collector()
+    _local.collector = collector
+    try:
+        yield collector
+    finally:
+        _local.collector = previous
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as processing stage `name`.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    collector = current_collector()
+    if collector is not None:
+        collector.add(name, seconds)
@@ -0,0 +1,118 @@
+import cv2
+import numpy as np
+
+import config
+import metrics
+from model_registry import registry
+from utils import preprocess_plate
+
+PLATE_ALLOWLIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# Crops are padded up to these multiples so similar-sized plates share a batch
+_BUCKET_HEIGHT = 32
+_BUCKET_WIDTH = 64
+
+
+def should_ocr(label):
+    """
+    Only vehicle / plate classes carry a readable plate (see ECOSCOUT_OCR_CLASSES).
+    """
+    return "*" in config.OCR_CLASSES or label.lower() in config.OCR_CLASSES
+
+
+def _bucket_size(img):
+    h, w = img.shape[:2]
+    bucket_h = -(-h // _BUCKET_HEIGHT) * _BUCKET_HEIGHT
+    bucket_w = -(-w // _BUCKET_WIDTH) * _BUCKET_WIDTH
+    return bucket_h, bucket_w
+
+
+def _pad(img, height, width):
+    """
+    Pad a binarized crop to height x width with its background value (the
+    median, as plates are mostly background). Replicating the edge instead
+    would smear characters touching the border into phantom strokes.
+    """
+    background = int(np.median(img))
+    return cv2.copyMakeBorder(img, 0, height - img.shape[0], 0, width - img.shape[1],
+                              cv2.BORDER_CONSTANT, value=background)
+
+
+def _parse(ocr_result):
+    """
+    Turn EasyOCR output for one crop into (plate_text, ocr_confidence %).
+    """
+    if not ocr_result:
+        return None, 0.0
+
+    # Sort results by x-coordinate (left to right)
+    ocr_result = sorted(ocr_result, key=lambda x: x[0][0][0])
+
+    # Concatenate all detected text segments
+    full_text = " ".join([res[1] for res in ocr_result])
+
+    # Calculate average confidence
+    avg_conf = sum([res[2] for res in ocr_result]) / len(ocr_result)
+
+    # Stricter threshold for OCR
+    if avg_conf > 0.4 and len(full_text) > 3:
+        return full_text, round(avg_conf * 100, 2)
+    return None, 0.0
+
+
+def read_plates(regions):
+    """
+    Read plates for many boxes with batched EasyOCR calls.
+    Args:
+        regions: List of (image, bbox) pairs. Images must be clean (unannotated).
+    Returns:
+        List of (plate_text or None, ocr_confidence %) in the same order
+    """
+    results = [(None, 0.0)] * len(regions)
+
+    # Preprocess every crop, then group them by padded size
+    buckets = {}
+    for i, (img, bbox) in enumerate(regions):
+        x1, y1, x2, y2 = bbox
+        crop = img[max(y1, 0):y2, max(x1, 0):x2]
+        if crop.size == 0:
+            continue
+        processed = preprocess_plate(crop)
+        if processed is None:
+            continue
+        buckets.setdefault(_bucket_size(processed), []).append((i, processed))
+
+    if not buckets:
+        return results
+
+    reader = registry.ocr_reader()
+    for (bucket_h, bucket_w), items in buckets.items():
+        padded = [_pad(img, bucket_h, bucket_w) for _, img in items]
+        with metrics.stage("ocr"):
+            batch_results = reader.readtext_batched(
+                padded, n_width=bucket_w, n_height=bucket_h,
+                batch_size=config.OCR_BATCH_SIZE, allowlist=PLATE_ALLOWLIST
+            )
+        for (i, _), ocr_result in zip(items, batch_results):
+            results[i] = _parse(ocr_result)
+
+    return results
+
+
+def apply_plates(frames, detections_per_frame):
+    """
+    Fill license_plate / ocr_confidence on the plate-class detections of one or
+    more frames, using a single batched OCR pass.
+    """
+    regions = []
+    targets = []
+    for frame, detections in zip(frames, detections_per_frame):
+        for d in detections:
+            if should_ocr(d["violation_type"]):
+                regions.append((frame, d["bbox"]))
+                targets.append(d)
+
+    for d, (plate, ocr_conf) in zip(targets, read_plates(regions)):
+        if plate:
+            d["license_plate"] = plate
+            d["ocr_confidence"] = ocr_conf
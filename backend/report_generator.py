@@ -3,20 +3,165 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
+import csv
+import glob
+import hashlib
+import io
+import itertools
+import json
 import os
+import uuid
+import zipfile
 from datetime import datetime
 
+import cv2
+
+import config
+import history_manager
+import metrics
+
+# PDF reports for history records, plus multi-record PDF/CSV exports.
+#
+# A record's report is cached in REPORTS_DIR as report_<id>_<hash>.pdf, where
+# the hash covers the record's content and the layout version: an unchanged
+# record is served from disk, a changed one gets a fresh file, and deleting the
+# record deletes its reports. Exports run as background jobs and load history
+# one page of records at a time. A PDF canvas keeps every page and image until
+# it is saved, so exports embed small copies of the annotated images and a
+# large PDF export is written as a zip of parts of REPORT_EXPORT_RECORDS_PER_FILE
+# records: memory is bounded by one part, whatever the date range.
+
+# Bump when the layout changes so cached reports are rebuilt
+REPORT_VERSION = 2
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 50
+HEADER_ROW_HEIGHT = 24
+ROW_HEIGHT = 18
+THUMB_COLUMNS = 3
+THUMB_GAP = 16
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+CSV_COLUMNS = [
+    'record_id', 'timestamp', 'media_type', 'original_file', 'source_id', 'frame',
+    'violation_type', 'confidence', 'license_plate', 'ocr_confidence', 'evidence_url'
+]
+
+
+def _exports_dir():
+    path = os.path.join(config.REPORTS_DIR, "exports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def report_hash(record):
+    """
+    Fingerprint of everything that ends up in the record's report.
+    """
+    payload = json.dumps([REPORT_VERSION, record], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def cached_report(record):
+    """
+    Path of the record's PDF report, generated only if no report of the
+    record's current content exists yet.
+    """
+    os.makedirs(config.REPORTS_DIR, exist_ok=True)
+    path = os.path.join(config.REPORTS_DIR, f"report_{record['id']}_{report_hash(record)}.pdf")
+    if os.path.exists(path):
+        metrics.REPORT_CACHE_LOOKUPS.inc(result="hit")
+        return path
+    metrics.REPORT_CACHE_LOOKUPS.inc(result="miss")
+
+    # Render to a temporary name so concurrent requests never serve a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with metrics.stage("report_render"):
+            generate_pdf_report(record, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Reports of older versions of the record are stale now
+    for old in _report_files(record['id']):
+        if old != path:
+            _remove_quietly(old)
+    return path
+
+
+def invalidate(ids):
+    """
+    Delete the cached reports of the given record ids.
+    """
+    for record_id in ids:
+        for path in _report_files(record_id):
+            _remove_quietly(path)
+
+
+def _report_files(record_id):
+    return glob.glob(os.path.join(glob.escape(config.REPORTS_DIR), f"report_{glob.escape(record_id)}_*.pdf"))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 def generate_pdf_report(record, output_path):
     """
     Generates a PDF report for a detection record.
     """
     c = canvas.Canvas(output_path, pagesize=letter)
-    width, height = letter
-    
+    _draw_record(c, record)
+    c.save()
+    return output_path
+
+
+def _results_path(url):
+    # http://localhost:8000/results/annotated_uuid.jpg -> RESULTS_DIR/annotated_uuid.jpg
+    return os.path.join(config.RESULTS_DIR, url.split('/')[-1]) if url else None
+
+
+def _image_reader(path, max_width, reduced=False):
+    """
+    The image at path downscaled to at most max_width pixels wide and
+    re-encoded as JPEG, so large frames don't bloat the PDF. None if unreadable.
+    """
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_2 if reduced else cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if w > max_width:
+        img = cv2.resize(img, (max_width, max(1, round(h * max_width / w))), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return ImageReader(io.BytesIO(buf.tobytes())) if ok else None
+
+
+def _draw_record(c, record, image_width=1200):
+    """
+    Draw one record starting at the top of the current page; returns with the
+    last page still open. The annotated image is embedded at most image_width
+    pixels wide.
+    """
+    height = PAGE_HEIGHT
+
     # Title
     c.setFont("Helvetica-Bold", 24)
-    c.drawString(50, height - 50, "EcoScout Detection Report")
-    
+    c.drawString(MARGIN, height - 50, "EcoScout Detection Report")
+
     # Timestamp
     c.setFont("Helvetica", 12)
     timestamp_str = record.get('timestamp', datetime.now().isoformat())
@@ -25,107 +170,315 @@ def generate_pdf_report(record, output_path):
         formatted_date = dt.strftime("%Y-%m-%d %H:%M:%S")
     except:
         formatted_date = timestamp_str
-        
-    c.drawString(50, height - 80, f"Date: {formatted_date}")
-    c.drawString(50, height - 100, f"File ID: {record.get('id', 'N/A')}")
-    c.drawString(50, height - 120, f"Original File: {record.get('original_file', 'N/A')}")
-    
+
+    c.drawString(MARGIN, height - 80, f"Date: {formatted_date}")
+    c.drawString(MARGIN, height - 100, f"File ID: {record.get('id', 'N/A')}")
+    c.drawString(MARGIN, height - 120, f"Original File: {record.get('original_file', 'N/A')}")
+
     # Summary
     detections = record.get('detections', [])
     violation_count = len([d for d in detections if d['violation_type'].lower() in ['littering', 'smoke']])
-    c.drawString(50, height - 150, f"Total Detections: {len(detections)}")
+    c.drawString(MARGIN, height - 150, f"Total Detections: {len(detections)}")
     c.setFillColor(colors.red if violation_count > 0 else colors.green)
     c.drawString(200, height - 150, f"Violations Found: {violation_count}")
     c.setFillColor(colors.black)
-    
-    # Image
-    # We need the local path to the annotated image.
-    # The record has 'annotated_image_url' or 'annotated_video_url'.
-    # We need to resolve this to a local path.
-    # Assuming the caller passes the record with enough info or we can derive it.
-    # For now, let's try to find the image in the 'results' directory based on the URL or filename.
-    
-    image_drawn = False
+
     current_y = height - 180
-    
-    # Try to find the image file
-    # If it's a video, we might not have a static image unless we saved a thumbnail or frame.
-    # In main.py, for video, we saved 'annotated_frame_...' for the first frame if we did that logic,
-    # but for full video processing we might not have a single image easily accessible unless we saved one.
-    # Let's assume for video we might skip the image or use a placeholder if not found.
-    
-    # Logic to find image path:
-    # URL: http://localhost:8000/results/annotated_uuid.jpg
-    # Local: results/annotated_uuid.jpg
-    
-    results_dir = os.path.join(os.path.dirname(__file__), 'results')
-    
-    image_filename = None
-    if 'annotated_image_url' in record:
-        image_filename = record['annotated_image_url'].split('/')[-1]
-    elif 'annotated_video_url' in record:
-        # For video, maybe we can't show a moving image. 
-        # But wait, in main.py for video we didn't explicitly save a "thumbnail" for the report.
-        # We could try to find 'annotated_frame_...' if it exists (from the placeholder logic) 
-        # OR just skip image for video reports for now.
-        pass
-        
-    if image_filename:
-        image_path = os.path.join(results_dir, image_filename)
-        if os.path.exists(image_path):
-            try:
-                # Resize image to fit
-                img = ImageReader(image_path)
-                img_width, img_height = img.getSize()
-                aspect = img_height / float(img_width)
-                
-                display_width = 400
-                display_height = display_width * aspect
-                
-                if current_y - display_height < 100:
-                    c.showPage()
-                    current_y = height - 50
-                
-                c.drawImage(img, 100, current_y - display_height, width=display_width, height=display_height)
-                current_y -= (display_height + 30)
-                image_drawn = True
-            except Exception as e:
-                print(f"Error drawing image: {e}")
-                c.drawString(50, current_y, "[Error loading image]")
-                current_y -= 30
-    
-    if not image_drawn:
-        c.drawString(50, current_y, "[Image not available for this report]")
-        current_y -= 30
-
-    # Detections Table
+    is_video = 'annotated_video_url' in record
+
+    # Annotated image; a video has its evidence frames further down instead
+    if not is_video:
+        current_y = _draw_annotated_image(c, _results_path(record.get('annotated_image_url')), current_y, image_width)
+
     if detections:
-        data = [['Type', 'Confidence', 'License Plate', 'OCR Conf']]
+        columns = ['Type', 'Confidence', 'License Plate', 'OCR Conf']
+        widths = [100, 80, 150, 80]
+        if is_video:
+            columns.insert(0, 'Frame')
+            widths = [60, 90, 80, 150, 80]
+        rows = []
         for d in detections:
-            data.append([
+            row = [
                 d.get('violation_type', 'N/A'),
                 f"{d.get('confidence', 0)}%",
-                d.get('license_plate', 'N/A'),
+                d.get('license_plate') or 'N/A',
                 f"{d.get('ocr_confidence', 0)}%"
-            ])
-            
-        table = Table(data, colWidths=[100, 80, 150, 80])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        if current_y - (len(data) * 20) < 50:
-             c.showPage()
-             current_y = height - 50
-             
-        table.wrapOn(c, width, height)
-        table.drawOn(c, 50, current_y - (len(data) * 20))
-        
+            ]
+            if is_video:
+                row.insert(0, str(d.get('frame', '')))
+            rows.append(row)
+        current_y = _draw_table(c, columns, widths, rows, current_y)
+
+    if is_video:
+        _draw_evidence(c, detections, current_y - 20)
+
+
+def _draw_annotated_image(c, image_path, current_y, image_width=1200):
+    img = None
+    if image_path and os.path.exists(image_path):
+        try:
+            img = _image_reader(image_path, image_width)
+        except Exception as e:
+            print(f"Error loading image: {e}")
+
+    if img is None:
+        c.drawString(MARGIN, current_y, "[Image not available for this report]")
+        return current_y - 30
+
+    img_width, img_height = img.getSize()
+    display_width = 400
+    display_height = display_width * img_height / float(img_width)
+    if current_y - display_height < 100:
+        c.showPage()
+        current_y = PAGE_HEIGHT - MARGIN
+    c.drawImage(img, 100, current_y - display_height, width=display_width, height=display_height)
+    return current_y - (display_height + 30)
+
+
+def _draw_table(c, columns, widths, rows, current_y):
+    """
+    Lay rows out as fixed-height tables that fill each page, repeating the
+    header on every page. Returns the y below the last row.
+    """
+    start = 0
+    while start < len(rows):
+        fits = int((current_y - MARGIN - HEADER_ROW_HEIGHT) // ROW_HEIGHT)
+        if fits < 1:
+            c.showPage()
+            current_y = PAGE_HEIGHT - MARGIN
+            continue
+        chunk = rows[start:start + fits]
+        table = Table([columns] + chunk, colWidths=widths,
+                      rowHeights=[HEADER_ROW_HEIGHT] + [ROW_HEIGHT] * len(chunk))
+        table.setStyle(TABLE_STYLE)
+        table_height = HEADER_ROW_HEIGHT + ROW_HEIGHT * len(chunk)
+        table.wrapOn(c, PAGE_WIDTH, PAGE_HEIGHT)
+        table.drawOn(c, MARGIN, current_y - table_height)
+        current_y -= table_height
+        start += len(chunk)
+    return current_y
+
+
+def _draw_evidence(c, detections, current_y):
+    """
+    Evidence frames of a video record as a grid of thumbnails, one frame
+    decoded at a time.
+    """
+    seen = set()
+    frames = []
+    for d in detections:
+        url = d.get('frame_image_url')
+        if url and url not in seen:
+            seen.add(url)
+            frames.append((url, d))
+    if not frames:
+        return current_y
+
+    shown = frames[:config.REPORT_MAX_THUMBNAILS]
+    c.setFont("Helvetica-Bold", 14)
+    if current_y - 40 < MARGIN:
+        c.showPage()
+        current_y = PAGE_HEIGHT - MARGIN
+    title = "Evidence Frames"
+    if len(frames) > len(shown):
+        title += f" (first {len(shown)} of {len(frames)})"
+    c.drawString(MARGIN, current_y, title)
+    current_y -= 20
+    c.setFont("Helvetica", 9)
+
+    thumb_width = (PAGE_WIDTH - 2 * MARGIN - (THUMB_COLUMNS - 1) * THUMB_GAP) / THUMB_COLUMNS
+    row_height = 0
+    for i, (url, d) in enumerate(shown):
+        column = i % THUMB_COLUMNS
+        if column == 0:
+            current_y -= row_height
+            row_height = 0
+
+        path = _results_path(url)
+        img = _image_reader(path, int(thumb_width * 2), reduced=True) if os.path.exists(path) else None
+        img_height = thumb_width * 9 / 16
+        if img is not None:
+            w, h = img.getSize()
+            img_height = thumb_width * h / float(w)
+        cell_height = img_height + 20
+
+        if column == 0 and current_y - cell_height < MARGIN:
+            c.showPage()
+            c.setFont("Helvetica", 9)
+            current_y = PAGE_HEIGHT - MARGIN
+        x = MARGIN + column * (thumb_width + THUMB_GAP)
+        if img is not None:
+            c.drawImage(img, x, current_y - img_height, width=thumb_width, height=img_height)
+        else:
+            c.rect(x, current_y - img_height, thumb_width, img_height)
+            c.drawString(x + 4, current_y - 12, "[Frame not available]")
+        caption = f"Frame {d.get('frame', '?')}: {d.get('violation_type', 'N/A')}"
+        plate = d.get('license_plate') or 'N/A'
+        if plate != 'N/A':
+            caption += f" ({plate})"
+        c.drawString(x, current_y - img_height - 12, caption)
+        row_height = max(row_height, cell_height)
+    return current_y - row_height
+
+
+def _record_pages(ids=None, start=None, end=None):
+    """
+    (total, generator of record pages) for an export: the given ids, or every
+    record in the [start, end] timestamp range, newest first.
+    """
+    page_size = max(1, config.REPORT_EXPORT_PAGE_SIZE)
+    if ids:
+        ids = list(dict.fromkeys(ids))
+
+        def id_pages():
+            for i in range(0, len(ids), page_size):
+                yield history_manager.get_records_by_ids(ids[i:i + page_size])
+        return len(ids), id_pages()
+
+    # Pin the end so records added during the export don't shift the pages
+    end = end or datetime.now().isoformat()
+    total, first = history_manager.query_records(limit=page_size, start=start, end=end)
+
+    def range_pages():
+        page, offset = first, 0
+        while page:
+            yield page
+            offset += len(page)
+            if offset >= total:
+                break
+            _, page = history_manager.query_records(limit=page_size, offset=offset, start=start, end=end)
+    return total, range_pages()
+
+
+def _prune_exports():
+    # In-progress exports (*.tmp) belong to running jobs
+    files = [path for path in glob.glob(os.path.join(glob.escape(_exports_dir()), "export_*"))
+             if not path.endswith(".tmp")]
+    files.sort(key=os.path.getmtime)
+    for path in files[:max(0, len(files) - config.REPORT_MAX_EXPORTS + 1)]:
+        _remove_quietly(path)
+
+
+def _iter_records(job, pages):
+    done = 0
+    for page in pages:
+        for record in page:
+            job.check_cancelled()
+            yield record
+            done += 1
+            job.update_progress(done)
+
+
+def _write_pdf(path, records, cover):
+    """
+    Write a cover page (cover = _draw_export_cover args) and the records into
+    one PDF. Returns (records written, detections written).
+    """
+    count = 0
+    detection_count = 0
+    c = canvas.Canvas(path, pagesize=letter)
+    _draw_export_cover(c, *cover)
+    for record in records:
+        c.showPage()
+        _draw_record(c, record, image_width=config.REPORT_EXPORT_IMAGE_WIDTH)
+        count += 1
+        detection_count += len(record.get('detections', []))
     c.save()
-    return output_path
+    return count, detection_count
+
+
+def export_records(job, ids=None, start=None, end=None, fmt="pdf"):
+    """
+    Job function: write the selected records into one PDF or CSV file, or a
+    zip of PDF parts when there are more than REPORT_EXPORT_RECORDS_PER_FILE.
+    Returns:
+        Summary with the export's download URL
+    """
+    _prune_exports()
+    total, pages = _record_pages(ids, start, end)
+    job.update_progress(0, total)
+    records = _iter_records(job, pages)
+
+    per_file = max(1, config.REPORT_EXPORT_RECORDS_PER_FILE)
+    parts = -(-total // per_file)
+    extension = "zip" if fmt == "pdf" and parts > 1 else fmt
+    filename = f"export_{job.id}.{extension}"
+    path = os.path.join(_exports_dir(), filename)
+    tmp_path = f"{path}.tmp"
+    part_path = f"{path}.part.tmp"
+    done = 0
+    detection_count = 0
+    try:
+        with metrics.stage("report_export"):
+            if fmt == "csv":
+                with open(tmp_path, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(CSV_COLUMNS)
+                    for record in records:
+                        writer.writerows(_csv_rows(record))
+                        detection_count += len(record.get('detections', []))
+                        done += 1
+            elif parts <= 1:
+                done, detection_count = _write_pdf(tmp_path, records, (total, ids, start, end))
+            else:
+                # PDFs are compressed already; store the parts as they are
+                with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as archive:
+                    for part in range(1, parts + 1):
+                        written, detections = _write_pdf(
+                            part_path, itertools.islice(records, per_file), (total, ids, start, end, part, parts)
+                        )
+                        if not written:
+                            break  # Fewer records than counted (deleted meanwhile)
+                        archive.write(part_path, f"export_{job.id}_part{part:03d}.pdf")
+                        done += written
+                        detection_count += detections
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (tmp_path, part_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    return {
+        "format": fmt,
+        "records": done,
+        "detections": detection_count,
+        "files": parts if extension == "zip" else 1,
+        "filename": filename,
+        "download_url": f"/reports/exports/{job.id}",
+    }
+
+
+def export_path(job_id):
+    """
+    Path of a finished export, or None.
+    """
+    for fmt in ("pdf", "csv", "zip"):
+        path = os.path.join(_exports_dir(), f"export_{job_id}.{fmt}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _csv_rows(record):
+    media_type = 'video' if 'annotated_video_url' in record else 'image'
+    for d in record.get('detections', []):
+        yield [
+            record.get('id'), record.get('timestamp'), media_type, record.get('original_file'),
+            record.get('source_id'), d.get('frame'), d.get('violation_type'), d.get('confidence'),
+            d.get('license_plate'), d.get('ocr_confidence'), d.get('frame_image_url')
+        ]
+
+
+def _draw_export_cover(c, total, ids, start, end, part=None, parts=None):
+    c.setFont("Helvetica-Bold", 24)
+    c.drawString(MARGIN, PAGE_HEIGHT - 50, "EcoScout Detection Export")
+    c.setFont("Helvetica", 12)
+    c.drawString(MARGIN, PAGE_HEIGHT - 80, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if ids:
+        selection = f"{len(ids)} selected records"
+    else:
+        selection = f"Records from {start or 'the beginning'} to {end or 'now'}"
+    c.drawString(MARGIN, PAGE_HEIGHT - 100, selection)
+    c.drawString(MARGIN, PAGE_HEIGHT - 120, f"Records: {total}")
+    if part:
+        c.drawString(MARGIN, PAGE_HEIGHT - 140, f"Part {part} of {parts}")
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+import history_manager
+from model_registry import registry
+
+# Content-addressed cache of processed uploads.
+#
+# An upload is keyed by the SHA-256 of its bytes, the camera source it was
+# uploaded for and a fingerprint of the model weights and the settings that
+# change detection output. A hit returns the existing history record and its
+# annotated artifacts without re-running the pipeline, so duplicates never add
+# files to RESULTS_DIR. Entries reference their history record (deleting the
+# record drops the entry and its files) and are evicted least-recently-used
+# beyond CACHE_MAX_ENTRIES. Evicting an entry only forgets the upload's hash:
+# the artifacts belong to the history record and stay as long as it does.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key TEXT PRIMARY KEY,
+    record_id TEXT NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    artifacts TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache(last_access);
+CREATE INDEX IF NOT EXISTS idx_result_cache_record ON result_cache(record_id);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+_fingerprint = None
+
+
+def _connect():
+    global _schema_ready
+    conn = history_manager.connection()
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(_SCHEMA)
+                conn.commit()
+                _schema_ready = True
+    return conn
+
+
+def model_fingerprint():
+    """
+    Identifies the weights and the settings that affect detections, so a model
+    or config change never serves stale results.
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        parts = {}
+        if os.path.exists(registry.model_path):
+            stat = os.stat(registry.model_path)
+            parts["model"] = [os.path.basename(registry.model_path), stat.st_size, int(stat.st_mtime)]
+        for name in ("INFERENCE_BACKEND", "INFERENCE_IMAGE_SIZE", "DETECTION_CONFIDENCE", "NMS_IOU_THRESHOLD",
+                     "ONNX_QUANTIZE", "TILED_INFERENCE", "TILE_MIN_IMAGE_SIZE", "TILE_SIZE", "TILE_OVERLAP",
+                     "TILE_FULL_FRAME_PASS", "TILE_MERGE_CONTAINMENT",
+                     "OCR_CLASSES", "SAMPLE_MIN_INTERVAL_FRAMES", "SAMPLE_MAX_INTERVAL_FRAMES",
+                     "MOTION_THRESHOLD", "MOTION_PIXEL_THRESHOLD", "SCENE_CHANGE_THRESHOLD", "TRACK_IOU_THRESHOLD",
+                     "TRACK_MAX_CENTROID_DISTANCE", "TRACK_MAX_AGE_FRAMES",
+                     "OCR_REFRESH_INTERVAL_FRAMES", "OCR_GOOD_CONFIDENCE"):
+            parts[name] = getattr(config, name, None)
+        _fingerprint = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+    return _fingerprint
+
+
+def cache_key(content_hash, source_id=None, variant=None):
+    """
+    content_hash is the SHA-256 hex digest of the uploaded bytes; source_id is
+    the camera source the upload is attributed to, so a hit never returns a
+    record of another source; variant distinguishes processing options such as
+    a region of interest.
+    """
+    key = f"{content_hash}:{model_fingerprint()}:{source_id or ''}"
+    return f"{key}:{variant}" if variant else key
+
+
+def lookup(key):
+    """
+    Returns the cached history record for key, or None.
+    """
+    if not config.CACHE_ENABLED:
+        return None
+    conn = _connect()
+    row = conn.execute("SELECT record_id, artifacts FROM result_cache WHERE cache_key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+
+    record = history_manager.get_record(row["record_id"])
+    if record is None or not all(os.path.exists(p) for p in json.loads(row["artifacts"])):
+        # Artifacts were removed behind our back; treat as a miss
+        with conn:
+            conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (key,))
+        return None
+
+    with conn:
+        conn.execute("UPDATE result_cache SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+    return record
+
+
+def store(key, record):
+    """
+    Remember the processed record for key, then enforce the size limits.
+    """
+    store_many([(key, record)])
+
+
+def store_many(entries):
+    """
+    Remember several (key, record) pairs in one transaction, then enforce the
+    size limits once.
+    """
+    if not config.CACHE_ENABLED or not entries:
+        return
+    now = time.time()
+    rows = []
+    for key, record in entries:
+        artifacts = [p for p in history_manager.artifact_paths(record) if os.path.exists(p)]
+        size = sum(os.path.getsize(p) for p in artifacts)
+        rows.append((key, record["id"], json.dumps(artifacts), size, now, now))
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO result_cache (cache_key, record_id, artifacts, size_bytes, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    evict()
+
+
+def evict():
+    """
+    Drop least-recently-used entries beyond CACHE_MAX_ENTRIES. Files are left
+    alone: they belong to the history record and go when it is deleted.
+    Returns the number of entries evicted.
+    """
+    conn = _connect()
+    count = conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+    excess = count - config.CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return 0
+
+    with conn:
+        evicted = conn.execute(
+            "DELETE FROM result_cache WHERE cache_key IN "
+            "(SELECT cache_key FROM result_cache ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        ).rowcount
+    print(f"Result cache evicted {evicted} entries ({count - evicted} entries left)")
+    return evicted
@@ -0,0 +1,58 @@
+import hashlib
+import json
+
+import cv2
+import numpy as np
+
+
+class RegionOfInterest:
+    """
+    A polygon of the camera view that detections must fall in.
+
+    Points are fractions of the frame width / height (0-1), so one polygon fits
+    every resolution a camera delivers. Frames are cropped to the polygon's
+    bounding rectangle before inference, and a box is kept only if its centre
+    lies inside the polygon.
+    """
+
+    def __init__(self, polygon):
+        points = [(float(p[0]), float(p[1])) for p in polygon]
+        if len(points) < 3:
+            raise ValueError("A region of interest needs at least 3 points")
+        if any(not (0.0 <= v <= 1.0) for point in points for v in point):
+            raise ValueError("Region of interest points must be fractions of the frame size (0-1)")
+        self.polygon = points
+        self._pixels = {}
+
+    @property
+    def key(self):
+        """
+        Short stable identifier of the polygon (part of result cache keys).
+        """
+        return hashlib.sha1(json.dumps([[round(x, 4), round(y, 4)] for x, y in self.polygon]).encode()).hexdigest()[:12]
+
+    def to_list(self):
+        return [list(point) for point in self.polygon]
+
+    def pixels(self, width, height):
+        """
+        The polygon in pixel coordinates of a width x height frame.
+        """
+        size = (width, height)
+        if size not in self._pixels:
+            self._pixels[size] = np.array(
+                [[round(x * width), round(y * height)] for x, y in self.polygon], dtype=np.int32
+            )
+        return self._pixels[size]
+
+    def crop_rect(self, width, height):
+        """
+        Bounding rectangle (x1, y1, x2, y2) of the polygon, clipped to the frame.
+        """
+        x, y, w, h = cv2.boundingRect(self.pixels(width, height))
+        return max(0, x), max(0, y), min(width, x + w), min(height, y + h)
+
+    def contains(self, bbox, width, height):
+        cx = (bbox[0] + bbox[2]) / 2.0
+        cy = (bbox[1] + bbox[3]) / 2.0
+        return cv2.pointPolygonTest(self.pixels(width, height), (float(cx), float(cy)), False) >= 0
@@ -0,0 +1,120 @@
+import json
+import threading
+import uuid
+from datetime import datetime
+
+import history_manager
+from roi import RegionOfInterest
+
+# Camera sources: a name, an optional stream URL and an optional region of
+# interest, kept in the history database next to the records they produce.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT,
+    roi TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Fields update_source() accepts
+EDITABLE_FIELDS = ("name", "url", "roi")
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    conn = history_manager.connection()
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(_SCHEMA)
+                conn.commit()
+                _schema_ready = True
+    return conn
+
+
+def _to_dict(row):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "url": row["url"],
+        "roi": json.loads(row["roi"]) if row["roi"] else None,
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def _validated_roi(roi):
+    # Raises ValueError for a malformed polygon
+    return RegionOfInterest(roi).to_list() if roi else None
+
+
+def create_source(name, url=None, roi=None):
+    roi = _validated_roi(roi)
+    now = datetime.now().isoformat()
+    source_id = str(uuid.uuid4())
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO sources (id, name, url, roi, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (source_id, name, url, json.dumps(roi) if roi else None, now, now),
+        )
+    return get_source(source_id)
+
+
+def update_source(source_id, **changes):
+    """
+    Change name, url and/or roi (roi=None removes the region). Returns the
+    updated source, or None if it doesn't exist. Raises TypeError for any
+    other field.
+    """
+    unknown = sorted(set(changes) - set(EDITABLE_FIELDS))
+    if unknown:
+        raise TypeError(f"Unknown source fields: {', '.join(unknown)}")
+    current = get_source(source_id)
+    if current is None:
+        return None
+    if "roi" in changes:
+        changes["roi"] = _validated_roi(changes["roi"])
+    current.update(changes)
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "UPDATE sources SET name = ?, url = ?, roi = ?, updated_at = ? WHERE id = ?",
+            (current["name"], current["url"], json.dumps(current["roi"]) if current["roi"] else None,
+             datetime.now().isoformat(), source_id),
+        )
+    return get_source(source_id)
+
+
+def delete_source(source_id):
+    conn = _connect()
+    with conn:
+        return conn.execute("DELETE FROM sources WHERE id = ?", (source_id,)).rowcount > 0
+
+
+def get_source(source_id):
+    row = _connect().execute("SELECT * FROM sources WHERE id = ?", (source_id,)).fetchone()
+    return _to_dict(row) if row else None
+
+
+def list_sources():
+    return [_to_dict(row) for row in _connect().execute("SELECT * FROM sources ORDER BY name, created_at")]
+
+
+def get_roi(source_id):
+    """
+    The source's RegionOfInterest, or None when it has none.
+    Raises:
+        KeyError: Unknown source
+    """
+    source = get_source(source_id)
+    if source is None:
+        raise KeyError(source_id)
+    return RegionOfInterest(source["roi"]) if source["roi"] else None
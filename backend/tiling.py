@@ -0,0 +1,67 @@
+import numpy as np
+
+# Geometry for tiled inference: covering an image with overlapping tiles and
+# merging the per-tile boxes back into one set of detections.
+
+
+def tile_rects(width, height, tile_size, overlap):
+    """
+    Overlapping tiles covering a width x height image. The last row / column
+    is aligned to the image edge rather than padded.
+    Returns:
+        List of (x1, y1, x2, y2)
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def merge_boxes(boxes, iou_threshold, containment=0.8):
+    """
+    Greedy per-class NMS over detections gathered from several tiles.
+
+    Besides the usual IoU test, a box lying mostly inside a higher-scoring box
+    of the same class (intersection / own area >= containment) is suppressed:
+    an object cut by a tile border leaves a partial box whose IoU with the
+    full box is low.
+    Args:
+        boxes: (N, 6) array of [x1, y1, x2, y2, conf, cls]
+    Returns:
+        The kept rows, highest confidence first
+    """
+    if len(boxes) == 0:
+        return boxes
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    # Equal scores: the larger (less truncated) box wins
+    order = np.lexsort((-areas, -boxes[:, 4]))
+    boxes, areas = boxes[order], areas[order]
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = np.nonzero(~suppressed & (boxes[:, 5] == boxes[i, 5]))[0]
+        rest = rest[rest > i]
+        if len(rest) == 0:
+            continue
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.maximum(ix2 - ix1, 0) * np.maximum(iy2 - iy1, 0)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        inside = inter / np.maximum(areas[rest], 1e-9)
+        suppressed[rest[(iou >= iou_threshold) | (inside >= containment)]] = True
+    return boxes[keep]
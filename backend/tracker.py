@@ -0,0 +1,260 @@
+from collections import Counter
+
+
+def iou(a, b):
+    """
+    Intersection over union of two [x1, y1, x2, y2] boxes.
+    """
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def _centroid_distance(a, b):
+    """
+    Distance between box centres, in units of the larger side of box a.
+    """
+    ax, ay = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    bx, by = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    scale = max(a[2] - a[0], a[3] - a[1], 1)
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / scale
+
+
+class Track:
+    """
+    One object followed across frames, with the best plate read so far.
+    """
+
+    def __init__(self, track_id, detection, frame_index):
+        self.id = track_id
+        self.bbox = detection["bbox"]
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 1
+        self.labels = Counter([detection["violation_type"]])
+        self.best_confidence = detection["confidence"]
+        self.best_bbox = detection["bbox"]
+        self.first_bbox = detection["bbox"]
+        self.plate = "N/A"
+        self.ocr_confidence = 0.0
+        self.last_ocr_frame = None
+        self.ocr_attempts = 0
+        self.evidence_url = None
+        self.evidence_count = 0
+        self.absorbed_by = None
+
+    @property
+    def label(self):
+        return self.labels.most_common(1)[0][0]
+
+    def update(self, detection, frame_index):
+        self.bbox = detection["bbox"]
+        self.last_frame = frame_index
+        self.hits += 1
+        self.labels[detection["violation_type"]] += 1
+        if detection["confidence"] > self.best_confidence:
+            self.best_confidence = detection["confidence"]
+            self.best_bbox = detection["bbox"]
+
+    def needs_ocr(self, frame_index, refresh_interval, good_confidence):
+        """
+        OCR a track on first sight, then only while its plate read is weak and
+        at most once per refresh_interval frames.
+        """
+        if self.last_ocr_frame is None:
+            return True
+        if self.ocr_confidence >= good_confidence:
+            return False
+        return frame_index - self.last_ocr_frame >= refresh_interval
+
+    def record_ocr(self, frame_index, plate, ocr_confidence):
+        """
+        Store an OCR attempt. Returns True if it improved the cached plate.
+        """
+        self.last_ocr_frame = frame_index
+        self.ocr_attempts += 1
+        if plate and ocr_confidence > self.ocr_confidence:
+            self.plate = plate
+            self.ocr_confidence = ocr_confidence
+            return True
+        return False
+
+    def absorb(self, other):
+        """
+        Append a later track of the same object (e.g. its continuation in the
+        next video segment), keeping the best box and the best plate read.
+        """
+        other.absorbed_by = self
+        self.bbox = other.bbox
+        self.last_frame = other.last_frame
+        self.hits += other.hits
+        self.labels.update(other.labels)
+        if other.best_confidence > self.best_confidence:
+            self.best_confidence = other.best_confidence
+            self.best_bbox = other.best_bbox
+        self.ocr_attempts += other.ocr_attempts
+        self.evidence_count += other.evidence_count
+        if other.ocr_confidence > self.ocr_confidence:
+            self.plate = other.plate
+            self.ocr_confidence = other.ocr_confidence
+            self.evidence_url = other.evidence_url or self.evidence_url
+        self.evidence_url = self.evidence_url or other.evidence_url
+
+    def root(self):
+        """
+        The track this one was finally merged into (itself if never absorbed).
+        """
+        track = self
+        while track.absorbed_by is not None:
+            track = track.absorbed_by
+        return track
+
+    def to_event(self, fps):
+        """
+        Consolidated violation event for the whole lifetime of the track.
+        """
+        return {
+            "track_id": self.id,
+            "violation_type": self.label,
+            "confidence": self.best_confidence,
+            "bbox": self.best_bbox,
+            "license_plate": self.plate,
+            "ocr_confidence": self.ocr_confidence,
+            "frame": self.first_frame,
+            "first_frame": self.first_frame,
+            "last_frame": self.last_frame,
+            "timestamp": self.first_frame / fps,
+            "end_timestamp": self.last_frame / fps,
+            "observations": self.hits,
+            "frame_image_url": self.evidence_url
+        }
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker with a centroid-distance fallback for fast movers.
+
+    Detections are matched to live tracks of the same class, best IoU first.
+    A detection left unmatched starts a new track; a track unseen for more than
+    max_age frames is closed. Closed tracks are kept for all_tracks() unless
+    keep_closed is False, as for a live stream that never ends.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.75, max_age=30, keep_closed=True):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_age = max_age
+        self.keep_closed = keep_closed
+        self.active = {}
+        self.closed = []
+        self._next_id = 1
+
+    def update(self, detections, frame_index):
+        """
+        Assign a track to every detection of one frame.
+        Sets detection["track_id"] in place and returns the matched Track objects
+        (same order as detections).
+        """
+        # Close tracks that have not been seen for too long
+        for track_id in [tid for tid, t in self.active.items() if frame_index - t.last_frame > self.max_age]:
+            track = self.active.pop(track_id)
+            if self.keep_closed:
+                self.closed.append(track)
+
+        candidates = []
+        for d_idx, d in enumerate(detections):
+            for track in self.active.values():
+                if track.label != d["violation_type"]:
+                    continue
+                overlap = iou(track.bbox, d["bbox"])
+                if overlap >= self.iou_threshold:
+                    candidates.append((overlap, 0.0, d_idx, track.id))
+                else:
+                    distance = _centroid_distance(track.bbox, d["bbox"])
+                    if distance <= self.max_centroid_distance:
+                        candidates.append((0.0, -distance, d_idx, track.id))
+        # Best IoU first, then closest centroid
+        candidates.sort(reverse=True)
+
+        matched = [None] * len(detections)
+        used_tracks = set()
+        for _, _, d_idx, track_id in candidates:
+            if matched[d_idx] is not None or track_id in used_tracks:
+                continue
+            track = self.active[track_id]
+            track.update(detections[d_idx], frame_index)
+            matched[d_idx] = track
+            used_tracks.add(track_id)
+
+        for d_idx, d in enumerate(detections):
+            if matched[d_idx] is None:
+                track = Track(self._next_id, d, frame_index)
+                self._next_id += 1
+                self.active[track.id] = track
+                matched[d_idx] = track
+            d["track_id"] = matched[d_idx].id
+
+        return matched
+
+    def all_tracks(self):
+        """
+        Closed and still-active tracks, ordered by first appearance.
+        """
+        return sorted(self.closed + list(self.active.values()), key=lambda t: (t.first_frame, t.id))
+
+
+def stitch_tracks(segments, iou_threshold=0.3, max_centroid_distance=0.75, max_age=30):
+    """
+    Join tracks from consecutive video segments that were tracked independently.
+
+    A track still alive at the end of one segment (seen within max_age frames of
+    the boundary) continues into a track of the same class that starts within
+    max_age frames after it, if their boxes overlap or are close enough.
+    Args:
+        segments: List of (start_frame, end_frame, tracks) in frame order
+    Returns:
+        The merged tracks ordered by first appearance, renumbered from 1
+    """
+    merged = []
+    open_tracks = []  # Tracks still alive at the end of the previous segment
+    for start, end, tracks in segments:
+        candidates = []
+        for new in tracks:
+            if new.first_frame - start > max_age:
+                continue
+            for old in open_tracks:
+                if old.label != new.label:
+                    continue
+                overlap = iou(old.bbox, new.first_bbox)
+                distance = _centroid_distance(old.bbox, new.first_bbox)
+                if overlap >= iou_threshold or distance <= max_centroid_distance:
+                    candidates.append((overlap, -distance, id(old), id(new), old, new))
+        candidates.sort(key=lambda c: c[:2], reverse=True)
+
+        continued = {}
+        used = set()
+        for _, _, old_key, new_key, old, new in candidates:
+            if old_key in used or new_key in continued:
+                continue
+            old.absorb(new)
+            used.add(old_key)
+            continued[new_key] = old
+
+        open_tracks = []
+        for track in tracks:
+            if id(track) in continued:
+                track = continued[id(track)]
+            else:
+                merged.append(track)
+            if end - track.last_frame <= max_age:
+                open_tracks.append(track)
+
+    merged.sort(key=lambda t: (t.first_frame, t.id))
+    for track_id, track in enumerate(merged, start=1):
+        track.id = track_id
+    return merged
@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+import metrics
+
 def preprocess_plate(plate_img):
     """
     Preprocess the license plate image for better OCR accuracy.
@@ -8,6 +10,10 @@ def preprocess_plate(plate_img):
     if plate_img is None or plate_img.size == 0:
         return None
 
+    with metrics.stage("preprocess_plate"):
+        return _preprocess_plate(plate_img)
+
+def _preprocess_plate(plate_img):
     # Convert to grayscale
     gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
 
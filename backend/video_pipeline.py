@@ -0,0 +1,251 @@
+import queue
+import threading
+import time
+
+import cv2
+
+import metrics
+from annotation import EvidenceWriter, draw_detections
+
+# Marks the end of the frame stream on a stage queue
+_END = object()
+
+
+def open_writer(output_path, fps, size):
+    """
+    mp4 writer for the annotated output, H.264 when OpenCV has an encoder for it.
+    """
+    # Use 'avc1' for H.264 which is web-friendly. Fallback to 'mp4v' if needed.
+    # Note: OpenCV requires openh264-1.8.0-win64.dll or similar for avc1 on Windows sometimes.
+    try:
+        fourcc = cv2.VideoWriter_fourcc(*'avc1')
+    except:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writer = cv2.VideoWriter(output_path, fourcc, fps, size)
+    if not writer.isOpened():
+        # VideoWriter_fourcc never raises; a missing H.264 encoder only shows up here
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    return writer
+
+
+class FramePacket:
+    """
+    One decoded frame travelling through the pipeline.
+
+    The analyze callback fills in detections (and optionally evidence_path) for
+    sampled frames; the encoder stage draws them, writes the result and hands
+    evidence frames to the EvidenceWriter.
+    """
+    __slots__ = ("index", "frame", "sampled", "detections", "evidence_path")
+
+    def __init__(self, index, frame, sampled):
+        self.index = index
+        self.frame = frame
+        self.sampled = sampled
+        self.detections = None
+        self.evidence_path = None
+
+
+class VideoPipeline:
+    """
+    Streams a video through three stages connected by bounded queues:
+
+        decoder thread -> inference stage (caller's thread) -> encoder thread
+
+    Decoding and mp4 encoding overlap with inference, so wall-clock time tends
+    towards the cost of the slowest stage. The queues cap how many frames are
+    held in memory regardless of video length.
+    """
+
+    def __init__(self, input_path, output_path, batch_size=8, gate=None,
+                 queue_size=64, check_cancelled=None, on_progress=None,
+                 start_frame=0, end_frame=None):
+        self.cap = cv2.VideoCapture(input_path)
+        if not self.cap.isOpened():
+            raise ValueError("Could not open video file")
+
+        # Video properties
+        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 25
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+        # Optional [start_frame, end_frame) range; packet indices stay absolute
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        if start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        self.writer = open_writer(output_path, self.fps, (self.width, self.height))
+
+        self.batch_size = max(1, batch_size)
+        # gate(frame, index) -> bool picks frames for inference; runs on the decoder thread
+        self.gate = gate or (lambda frame, index: index % 5 == 0)
+        self.check_cancelled = check_cancelled
+        self.on_progress = on_progress
+
+        self.queue_size = max(1, queue_size)
+        self._decoded = queue.Queue(maxsize=self.queue_size)
+        self._encoded = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        # Stage timings from the decoder/encoder threads count towards the caller's request
+        self._collector = metrics.current_collector()
+
+        self.frames_decoded = 0
+        self.frames_inferred = 0
+        self.frames_written = 0
+        self.stage_seconds = {"decode": 0.0, "inference": 0.0, "encode": 0.0}
+
+    def run(self, analyze):
+        """
+        Process the whole video.
+        Args:
+            analyze: Called with a list of sampled FramePackets (at most batch_size)
+                     and expected to set their detections / evidence_path.
+        Returns:
+            Stats dict with frame counts, per-stage busy time and throughput
+        """
+        started = time.perf_counter()
+        self.evidence = EvidenceWriter()
+        decoder = threading.Thread(target=self._guard, args=(self._decode,), name="video-decoder", daemon=True)
+        encoder = threading.Thread(target=self._guard, args=(self._encode,), name="video-encoder", daemon=True)
+        decoder.start()
+        encoder.start()
+
+        try:
+            self._infer(analyze)
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            decoder.join()
+            encoder.join()
+            self.cap.release()
+            self.writer.release()
+            # Evidence still being written must land before anyone cleans up after a failure
+            try:
+                self.evidence.close()
+            except Exception as e:
+                self._error = self._error or e
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - started
+        return {
+            "frames_decoded": self.frames_decoded,
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_decoded - self.frames_inferred,
+            "frames_written": self.frames_written,
+            "wall_seconds": round(elapsed, 3),
+            "stage_seconds": {name: round(value, 3) for name, value in self.stage_seconds.items()},
+            "processing_fps": round(self.frames_written / elapsed, 2) if elapsed > 0 else None,
+            "inference_fps": round(self.frames_inferred / self.stage_seconds["inference"], 2)
+                             if self.stage_seconds["inference"] > 0 else None
+        }
+
+    def _guard(self, stage):
+        # Runs a worker stage; any failure stops the other stages and is re-raised by run()
+        try:
+            with metrics.collect(self._collector):
+                stage()
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _decode(self):
+        index = self.start_frame
+        while not self._stop.is_set():
+            if self.end_frame is not None and index >= self.end_frame:
+                break
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            t1 = time.perf_counter()
+            if not ret:
+                break
+            metrics.record_stage("video_decode", t1 - t0)
+            with metrics.stage("frame_gate"):
+                sampled = self.gate(frame, index)
+            self.stage_seconds["decode"] += time.perf_counter() - t0
+            metrics.FRAMES.inc(kind="inferred" if sampled else "skipped")
+            if not self._put(self._decoded, (index, frame, sampled)):
+                return
+            index += 1
+            self.frames_decoded = index - self.start_frame
+        self._put(self._decoded, _END)
+
+    def _infer(self, analyze):
+        pending = []
+        sampled = []
+        while True:
+            if self.check_cancelled:
+                self.check_cancelled()
+            item = self._get(self._decoded)
+            if item is None:
+                return  # Another stage failed
+            if item is _END:
+                break
+
+            packet = FramePacket(*item)
+            pending.append(packet)
+            if packet.sampled:
+                sampled.append(packet)
+            # A sparse gate can leave the batch short for many frames; flush on
+            # the held frames too, so memory stays bounded and the encoder fed
+            if len(sampled) >= self.batch_size or len(pending) >= self.queue_size:
+                self._flush(analyze, pending, sampled)
+
+        if pending:
+            self._flush(analyze, pending, sampled)
+        self._put(self._encoded, _END)
+
+    def _flush(self, analyze, pending, sampled):
+        if sampled:
+            t0 = time.perf_counter()
+            analyze(sampled)
+            self.stage_seconds["inference"] += time.perf_counter() - t0
+            self.frames_inferred += len(sampled)
+
+        for packet in pending:
+            if not self._put(self._encoded, packet):
+                break
+        if self.on_progress:
+            self.on_progress(pending[-1].index + 1 - self.start_frame)
+        pending.clear()
+        sampled.clear()
+
+    def _encode(self):
+        while True:
+            packet = self._get(self._encoded)
+            if packet is None or packet is _END:
+                return
+
+            t0 = time.perf_counter()
+            if packet.detections:
+                draw_detections(packet.frame, packet.detections)
+                # Evidence image is the annotated video frame itself; nothing draws on it after this
+                if packet.evidence_path:
+                    self.evidence.submit(packet.evidence_path, packet.frame)
+            with metrics.stage("video_encode"):
+                self.writer.write(packet.frame)
+            self.frames_written += 1
+            self.stage_seconds["encode"] += time.perf_counter() - t0
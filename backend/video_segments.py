@@ -0,0 +1,208 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+
+import cv2
+
+import config
+import metrics
+from job_manager import JobCancelled
+from video_pipeline import open_writer
+
+# Parallel processing of long videos.
+#
+# A video is split into contiguous frame ranges that are decoded, inferred and
+# encoded by separate worker processes, each with its own model instances (the
+# registry is per process). The pool is created on first use and kept, so
+# models load once per worker rather than once per video. Worker processes use
+# the "spawn" start method: forking a process that already runs torch and
+# OpenCV threads is not safe.
+#
+# Stage histograms recorded inside the workers stay in those processes; the
+# parent only sees their frame counts and per-request timings.
+
+_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+_worker_initializer = None
+
+
+def plan_segments(total_frames, workers, min_frames):
+    """
+    Split [0, total_frames) into at most `workers` ranges of at least min_frames.
+    total_frames is the container's estimate and may be short (VFR, remuxed
+    files), so the last range is open-ended and reads to the end of the file.
+    Returns:
+        List of (start_frame, end_frame or None), empty if the video is not worth splitting
+    """
+    if not total_frames or workers < 2:
+        return []
+    count = min(workers, total_frames // max(1, min_frames))
+    if count < 2:
+        return []
+    size = -(-total_frames // count)
+    segments = [(start, min(start + size, total_frames)) for start in range(0, total_frames, size)]
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+
+def set_worker_initializer(func, *args):
+    """
+    Run func(*args) in every worker process before it takes work (e.g. to
+    install the benchmark stubs). Must be called before the pool is created.
+    """
+    global _worker_initializer
+    _worker_initializer = (func, args)
+
+
+def _init_worker(threads, initializer, preload):
+    # Split the cores between workers instead of each one using all of them
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if initializer:
+        func, args = initializer
+        func(*args)
+    if preload:
+        from model_registry import registry
+        registry.load()
+
+
+def get_pool():
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is None:
+            workers = max(2, config.VIDEO_SEGMENT_WORKERS)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            context = multiprocessing.get_context("spawn")
+            _manager = context.Manager()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker,
+                initargs=(threads, _worker_initializer, config.PRELOAD_MODELS)
+            )
+            print(f"Started {workers} video segment workers ({threads} threads each)")
+        return _pool, _manager
+
+
+def shutdown():
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _manager.shutdown()
+            _pool = None
+            _manager = None
+
+
+class SegmentChannel:
+    """
+    What a segment worker gets from the parent job: a shared cancel flag and a
+    shared progress slot. Checks of the flag are throttled, each one is an IPC
+    round trip.
+    """
+
+    def __init__(self, cancel_event, progress, key, interval=0.5):
+        self.cancel_event = cancel_event
+        self.progress = progress
+        self.key = key
+        self.interval = interval
+        self._checked = 0.0
+
+    def check_cancelled(self):
+        now = time.monotonic()
+        if now - self._checked >= self.interval:
+            self._checked = now
+            if self.cancel_event.is_set():
+                raise JobCancelled()
+
+    def update_progress(self, frames_done):
+        self.progress[self.key] = frames_done
+
+    def __getstate__(self):
+        return (self.cancel_event, self.progress, self.key, self.interval)
+
+    def __setstate__(self, state):
+        self.cancel_event, self.progress, self.key, self.interval = state
+        self._checked = 0.0
+
+
+def run_segments(func, tasks, check_cancelled=None, on_progress=None):
+    """
+    Run func(channel, *task) for every task in the worker pool.
+    Args:
+        func: Top-level (picklable) function executed in a worker process
+        tasks: Argument tuples, one per segment
+        check_cancelled: Polled in the parent; raising stops all segments
+        on_progress: Called with the total frames done across segments
+    Returns:
+        The results in task order
+    """
+    pool, manager = get_pool()
+    cancel_event = manager.Event()
+    progress = manager.dict()
+    futures = [pool.submit(func, SegmentChannel(cancel_event, progress, i), *task) for i, task in enumerate(tasks)]
+
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()  # Re-raise a worker failure here
+            if on_progress:
+                on_progress(sum(progress.values()))
+            if check_cancelled:
+                check_cancelled()
+    except BaseException:
+        # Stop the other segments; wait so their partial files can be cleaned up
+        cancel_event.set()
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+    return [future.result() for future in futures]
+
+
+def concat_videos(paths, output_path, fps, size):
+    """
+    Join segment videos in order. Uses ffmpeg's concat demuxer (stream copy, no
+    re-encode) when ffmpeg is installed, otherwise re-encodes with OpenCV.
+    """
+    with metrics.stage("video_concat"):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg:
+            fd, list_path = tempfile.mkstemp(suffix=".txt")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    for path in paths:
+                        f.write(f"file '{os.path.abspath(path)}'\n")
+                done = subprocess.run(
+                    [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                     "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path],
+                    capture_output=True
+                )
+                if done.returncode == 0:
+                    return
+                print(f"ffmpeg concat failed, re-encoding instead: {done.stderr.decode(errors='replace').strip()}")
+            finally:
+                os.remove(list_path)
+
+        writer = open_writer(output_path, fps, size)
+        try:
+            for path in paths:
+                cap = cv2.VideoCapture(path)
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    writer.write(frame)
+                cap.release()
+        finally:
+            writer.release()
@@ -1,21 +1,35 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { Trash2, Eye, Calendar, CheckSquare, Square, FileText } from 'lucide-react';
+import { Trash2, Eye, Calendar, CheckSquare, Square, FileText, ChevronLeft, ChevronRight } from 'lucide-react';
 import './History.css';
 
+const PAGE_SIZE = 50;
+
 const History = ({ onViewResult }) => {
     const [history, setHistory] = useState([]);
     const [selectedIds, setSelectedIds] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [offset, setOffset] = useState(0);
+    const [total, setTotal] = useState(0);
 
     useEffect(() => {
-        fetchHistory();
-    }, []);
+        fetchHistory(offset);
+    }, [offset]);
 
-    const fetchHistory = async () => {
+    const fetchHistory = async (pageOffset) => {
         try {
-            const response = await axios.get('http://localhost:8000/history');
+            // The API pages history; X-Total-Count has the number of records
+            const response = await axios.get('http://localhost:8000/history', {
+                params: { limit: PAGE_SIZE, offset: pageOffset }
+            });
+            const count = parseInt(response.headers['x-total-count'], 10) || 0;
+            if (response.data.length === 0 && pageOffset > 0 && count > 0) {
+                // The page emptied (e.g. after deleting); step back to the last page
+                setOffset(Math.max(0, Math.floor((count - 1) / PAGE_SIZE) * PAGE_SIZE));
+                return;
+            }
             setHistory(response.data);
+            setTotal(count);
             setLoading(false);
         } catch (error) {
             console.error("Failed to fetch history:", error);
@@ -31,11 +45,25 @@ const History = ({ onViewResult }) => {
         }
     };
 
+    // Selections persist across pages; the header checkbox toggles the current page
+    const pageIds = history.map(item => item.id);
+    const pageSelected = pageIds.length > 0 && pageIds.every(id => selectedIds.includes(id));
+
     const toggleSelectAll = () => {
-        if (selectedIds.length === history.length) {
-            setSelectedIds([]);
+        if (pageSelected) {
+            setSelectedIds(selectedIds.filter(id => !pageIds.includes(id)));
         } else {
-            setSelectedIds(history.map(item => item.id));
+            setSelectedIds([...selectedIds, ...pageIds.filter(id => !selectedIds.includes(id))]);
+        }
+    };
+
+    const handleView = async (id) => {
+        // The list only has summaries; load the full record for the result view
+        try {
+            const response = await axios.get(`http://localhost:8000/history/${id}`);
+            onViewResult(response.data);
+        } catch (error) {
+            console.error("Failed to load record:", error);
         }
     };
 
@@ -45,8 +73,8 @@ const History = ({ onViewResult }) => {
         if (window.confirm(`Are you sure you want to delete ${selectedIds.length} records?`)) {
             try {
                 await axios.delete('http://localhost:8000/history', { data: selectedIds });
-                setHistory(history.filter(item => !selectedIds.includes(item.id)));
                 setSelectedIds([]);
+                fetchHistory(offset);
             } catch (error) {
                 console.error("Failed to delete records:", error);
             }
@@ -91,7 +119,7 @@ const History = ({ onViewResult }) => {
                 <div className="history-grid">
                     <div className="grid-header">
                         <div className="col-select" onClick={toggleSelectAll}>
-                            {selectedIds.length === history.length && history.length > 0 ?
+                            {pageSelected ?
                                 <CheckSquare size={20} color="var(--accent-primary)" /> :
                                 <Square size={20} />
                             }
@@ -119,11 +147,11 @@ const History = ({ onViewResult }) => {
                                     <span>{new Date(record.timestamp).toLocaleString()}</span>
                                 </div>
                                 <div className="col-violations">
-                                    {record.detections.length > 0 ? (
+                                    {record.detection_count > 0 ? (
                                         <div className="tags">
-                                            {record.detections.map((d, i) => (
-                                                <span key={i} className={`tag ${d.violation_type.toLowerCase()}`}>
-                                                    {d.violation_type}
+                                            {Object.entries(record.violation_counts).map(([type, count]) => (
+                                                <span key={type} className={`tag ${type.toLowerCase()}`}>
+                                                    {count > 1 ? `${type} ×${count}` : type}
                                                 </span>
                                             ))}
                                         </div>
@@ -132,7 +160,7 @@ const History = ({ onViewResult }) => {
                                     )}
                                 </div>
                                 <div className="col-actions">
-                                    <button className="view-btn" onClick={() => onViewResult(record)}>
+                                    <button className="view-btn" onClick={() => handleView(record.id)}>
                                         <Eye size={18} />
                                         <span>View</span>
                                     </button>
@@ -145,6 +173,30 @@ const History = ({ onViewResult }) => {
                     </div>
                 </div>
             )}
+
+            {total > PAGE_SIZE && (
+                <div className="history-pager">
+                    <button
+                        className="pager-btn"
+                        disabled={offset === 0}
+                        onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
+                    >
+                        <ChevronLeft size={18} />
+                        <span>Newer</span>
+                    </button>
+                    <span className="pager-info">
+                        {offset + 1}–{Math.min(offset + PAGE_SIZE, total)} of {total}
+                    </span>
+                    <button
+                        className="pager-btn"
+                        disabled={offset + PAGE_SIZE >= total}
+                        onClick={() => setOffset(offset + PAGE_SIZE)}
+                    >
+                        <span>Older</span>
+                        <ChevronRight size={18} />
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
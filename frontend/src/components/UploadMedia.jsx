@@ -8,6 +8,7 @@ const UploadMedia = ({ onUploadSuccess }) => {
     const [preview, setPreview] = useState(null);
     const [uploading, setUploading] = useState(false);
     const [error, setError] = useState(null);
+    const [progress, setProgress] = useState(null);
     const fileInputRef = useRef(null);
 
     const handleFileChange = (e) => {
@@ -64,17 +65,37 @@ const UploadMedia = ({ onUploadSuccess }) => {
                 },
             });
 
-            if (response.data) {
-                onUploadSuccess(response.data);
+            // The API queues the file and returns a job; poll until it finishes.
+            // Re-uploads of already processed files come back completed straight away.
+            const job = response.data.status === 'completed'
+                ? response.data
+                : await waitForJob(response.data.job_id);
+
+            if (job.status === 'completed' && job.result) {
+                onUploadSuccess(job.result);
                 setFile(null);
                 setPreview(null);
                 if (fileInputRef.current) fileInputRef.current.value = "";
+            } else {
+                setError(job.error || `Processing ${job.status}.`);
             }
         } catch (err) {
             console.error("Upload failed:", err);
             setError(err.response?.data?.detail || "Upload failed. Please try again.");
         } finally {
             setUploading(false);
+            setProgress(null);
+        }
+    };
+
+    const waitForJob = async (jobId) => {
+        while (true) {
+            const { data } = await axios.get(`http://localhost:8000/jobs/${jobId}`);
+            if (['completed', 'failed', 'cancelled'].includes(data.status)) {
+                return data;
+            }
+            setProgress(data.progress?.percent ?? null);
+            await new Promise((resolve) => setTimeout(resolve, 1000));
         }
     };
 
@@ -143,7 +164,7 @@ const UploadMedia = ({ onUploadSuccess }) => {
                     onClick={handleUpload}
                     disabled={!file || uploading}
                 >
-                    {uploading ? "Processing..." : "Run Detection"}
+                    {uploading ? (progress !== null ? `Processing... ${Math.round(progress)}%` : "Processing...") : "Run Detection"}
                 </button>
             </div>
         </div>